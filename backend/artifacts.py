@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+
+import orjson
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session, selectinload
+
+from database import Base
+from models import FlashcardSet, Note, NoteGroup, QuizSet, StudyPlan
+from openai_client import FLASHCARD_PROMPT, QUIZ_PROMPT, STUDY_PLAN_PROMPT
+from schemas import (
+    Flashcard,
+    FlashcardsOut,
+    QuizOut,
+    QuizQuestion,
+    StudyDay,
+    StudyPlanOut,
+)
+
+NOTE_SEPARATOR = "\n\n---\n\n"
+
+# Stamped on every stored artifact. Rows with the current version were
+# validated on write and are served as stored; bump this when a change to the
+# output schemas means older rows must be validated again on read.
+SCHEMA_VERSION = 1
+
+# Member notes as generation needs them: one extra query, id and content only.
+GROUP_CONTENT = selectinload(NoteGroup.notes).load_only(Note.id, Note.content)
+
+
+@dataclass(frozen=True)
+class ArtifactType:
+    kind: str
+    label: str
+    model: type[Base]
+    schema: type[BaseModel]
+    prompt: str
+    items_key: str
+    item_schema: type[BaseModel]
+
+
+ARTIFACT_TYPES: dict[str, ArtifactType] = {
+    "flashcards": ArtifactType(
+        kind="flashcards",
+        label="flashcards",
+        model=FlashcardSet,
+        schema=FlashcardsOut,
+        prompt=FLASHCARD_PROMPT,
+        items_key="flashcards",
+        item_schema=Flashcard,
+    ),
+    "quiz": ArtifactType(
+        kind="quiz",
+        label="quiz",
+        model=QuizSet,
+        schema=QuizOut,
+        prompt=QUIZ_PROMPT,
+        items_key="quiz",
+        item_schema=QuizQuestion,
+    ),
+    "study-plan": ArtifactType(
+        kind="study-plan",
+        label="study plan",
+        model=StudyPlan,
+        schema=StudyPlanOut,
+        prompt=STUDY_PLAN_PROMPT,
+        items_key="plan",
+        item_schema=StudyDay,
+    ),
+}
+
+
+def owner_notes(db: Session, note_id: int | None, group_id: int | None) -> list[tuple[int, str]] | None:
+    """Return the ``(id, content)`` of the notes an owner is generated from, or None if it is gone."""
+    if note_id is not None:
+        note = db.get(Note, note_id)
+        return [(note.id, note.content)] if note else None
+    group = db.get(NoteGroup, group_id, options=[GROUP_CONTENT])
+    if not group or not group.notes:
+        return None
+    return [(n.id, n.content) for n in group.notes]
+
+
+def owner_documents(db: Session, note_id: int | None, group_id: int | None) -> list[str] | None:
+    """Return the generation input for a note or group, or None if it is gone."""
+    notes = owner_notes(db, note_id, group_id)
+    return None if notes is None else [content for _, content in notes]
+
+
+def stored_body(kind: str, schema_version: int, raw: str) -> bytes:
+    """Response body for a stored artifact's JSON text.
+
+    Raises ValueError if a row from an older schema version no longer validates.
+    """
+    if schema_version == SCHEMA_VERSION:
+        return raw.encode("utf-8")
+    return ARTIFACT_TYPES[kind].schema.model_validate_json(raw).model_dump_json().encode("utf-8")
+
+
+def stored_items(kind: str, schema_version: int, raw: str) -> list:
+    """The item list of a stored artifact, validated only for older schema versions."""
+    artifact = ARTIFACT_TYPES[kind]
+    if schema_version == SCHEMA_VERSION:
+        return orjson.loads(raw)[artifact.items_key]
+    return artifact.schema.model_validate_json(raw).model_dump(mode="json")[artifact.items_key]
@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import orjson
+from openai import OpenAIError
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from artifacts import ARTIFACT_TYPES, NOTE_SEPARATOR, SCHEMA_VERSION, owner_documents
+from cache import cache_key, generation_cache
+from chunking import chunk_documents
+from database import SessionLocal
+from fragments import content_hash
+from llm_client import call_with_retries, client_manager
+from models import BatchJob, GenerationJob, Note
+from openai_client import MODEL, TEMPERATURE, completion_request, parse_output, prepare_content
+from response_cache import artifact_keys, response_cache
+from schemas import BatchCreate
+
+logger = logging.getLogger(__name__)
+
+BATCH_TRANSPORT = os.getenv("BATCH_TRANSPORT", "openai")
+BATCH_FILE_DIR = os.getenv("BATCH_FILE_DIR", str(Path(__file__).parent / "batches"))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+# A batch still "processing" this long after it was claimed is assumed to
+# belong to a process that stopped, and is applied again.
+BATCH_STALE_SECONDS = int(os.getenv("BATCH_STALE_SECONDS", "600"))
+# The Batch API's per-batch request limit.
+BATCH_MAX_REQUESTS = 50_000
+
+# Only the first item failures are kept in detail; the rest are counted.
+MAX_BATCH_ERRORS = 100
+
+COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    state: str  # "pending", "completed" or "failed"
+    output: bytes = b""
+    errors: bytes = b""
+    detail: str | None = None
+
+
+class OpenAIBatchTransport:
+    """Submits JSONL request files to the OpenAI Batch API."""
+
+    def submit(self, jsonl: bytes) -> str:
+        client = client_manager.client()
+        upload = call_with_retries(client.files.create, file=("batch.jsonl", jsonl), purpose="batch")
+        batch = call_with_retries(
+            client.batches.create,
+            input_file_id=upload.id,
+            endpoint=COMPLETIONS_ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def poll(self, provider_batch_id: str) -> BatchResult:
+        client = client_manager.client()
+        batch = call_with_retries(client.batches.retrieve, provider_batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing"):
+            return BatchResult("pending")
+        if batch.status != "completed":
+            return BatchResult("failed", detail=f"Batch {batch.status}")
+        output = errors = b""
+        if batch.output_file_id:
+            output = call_with_retries(client.files.content, batch.output_file_id).read()
+        if batch.error_file_id:
+            errors = call_with_retries(client.files.content, batch.error_file_id).read()
+        return BatchResult("completed", output, errors)
+
+
+class FileBatchTransport:
+    """Exchanges batches through a directory, for local runs against a fake provider.
+
+    ``submit`` writes ``<id>.input.jsonl``. The batch completes once the
+    provider writes ``<id>.output.jsonl`` (and optionally
+    ``<id>.errors.jsonl``) in the Batch API's output format, or fails if it
+    writes ``<id>.failed`` containing the reason.
+    """
+
+    def __init__(self, directory: str = BATCH_FILE_DIR):
+        self.directory = Path(directory)
+
+    def submit(self, jsonl: bytes) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        provider_batch_id = f"file-batch-{uuid.uuid4().hex}"
+        (self.directory / f"{provider_batch_id}.input.jsonl").write_bytes(jsonl)
+        return provider_batch_id
+
+    def poll(self, provider_batch_id: str) -> BatchResult:
+        failed = self.directory / f"{provider_batch_id}.failed"
+        if failed.exists():
+            return BatchResult("failed", detail=failed.read_text().strip() or "Batch failed")
+        output = self.directory / f"{provider_batch_id}.output.jsonl"
+        if not output.exists():
+            return BatchResult("pending")
+        errors = self.directory / f"{provider_batch_id}.errors.jsonl"
+        return BatchResult(
+            "completed", output.read_bytes(), errors.read_bytes() if errors.exists() else b""
+        )
+
+
+def _transport_from_env():
+    if BATCH_TRANSPORT == "file":
+        return FileBatchTransport()
+    if BATCH_TRANSPORT == "openai":
+        return OpenAIBatchTransport()
+    raise RuntimeError(f"Unknown BATCH_TRANSPORT {BATCH_TRANSPORT!r}")
+
+
+def _owners(db, payload: BatchCreate) -> list[tuple[int | None, int | None, list[str]]]:
+    """Load the generation input of every requested note and group.
+
+    Raises LookupError naming the first owner that is missing (or, for a
+    group, has no notes).
+    """
+    note_ids = list(dict.fromkeys(payload.note_ids))
+    contents = dict(db.execute(select(Note.id, Note.content).where(Note.id.in_(note_ids))).all())
+    owners: list[tuple[int | None, int | None, list[str]]] = []
+    for note_id in note_ids:
+        if note_id not in contents:
+            raise LookupError(f"Note {note_id} not found")
+        owners.append((note_id, None, [contents[note_id]]))
+    for group_id in dict.fromkeys(payload.group_ids):
+        documents = owner_documents(db, None, group_id)
+        if documents is None:
+            raise LookupError(f"Group {group_id} not found or has no notes")
+        owners.append((None, group_id, documents))
+    return owners
+
+
+def _artifact_row(kind: str, note_id: int | None, group_id: int | None, data: dict, source_hash: str):
+    return ARTIFACT_TYPES[kind].model(
+        note_id=note_id,
+        group_id=group_id,
+        json_data=data,
+        source_hash=source_hash,
+        schema_version=SCHEMA_VERSION,
+    )
+
+
+def create_batch(payload: BatchCreate, transport) -> BatchJob:
+    """Build and submit a batch for every (owner, kind) pair in ``payload``.
+
+    Pairs already in the generation cache are stored right away, and inputs
+    too large for a single request become regular generation jobs (their ids
+    are in ``job_ids``), since map-reduce needs more than one round-trip.
+    Raises LookupError for unknown owners and ValueError for oversized batches.
+    """
+    with SessionLocal() as db:
+        owners = _owners(db, payload)
+        kinds = list(dict.fromkeys(payload.kinds))
+        if len(owners) * len(kinds) > BATCH_MAX_REQUESTS:
+            raise ValueError(f"A batch can hold at most {BATCH_MAX_REQUESTS} requests")
+
+        items: list[dict] = []
+        lines: list[bytes] = []
+        jobs: list[GenerationJob] = []
+        cached: list = []
+        invalidated: list[str] = []
+        for note_id, group_id, documents in owners:
+            source_hash = content_hash(NOTE_SEPARATOR.join(documents))
+            chunks = chunk_documents(documents)
+            for kind in kinds:
+                artifact = ARTIFACT_TYPES[kind]
+                if len(chunks) > 1:
+                    jobs.append(GenerationJob(
+                        id=uuid.uuid4().hex,
+                        kind=kind,
+                        note_id=note_id,
+                        group_id=group_id,
+                        fresh=payload.fresh,
+                        status="queued",
+                    ))
+                    continue
+                content = prepare_content(chunks[0])
+                key = cache_key(artifact.prompt, MODEL, TEMPERATURE, content)
+                data = None if payload.fresh else generation_cache.get(key)
+                if data is not None:
+                    cached.append(_artifact_row(kind, note_id, group_id, data, source_hash))
+                    invalidated += artifact_keys(kind, note_id, group_id)
+                    continue
+                custom_id = f"{kind}:note:{note_id}" if note_id is not None else f"{kind}:group:{group_id}"
+                items.append({
+                    "custom_id": custom_id,
+                    "kind": kind,
+                    "note_id": note_id,
+                    "group_id": group_id,
+                    "source_hash": source_hash,
+                    "cache_key": key,
+                })
+                lines.append(orjson.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": COMPLETIONS_ENDPOINT,
+                    "body": completion_request(artifact.prompt, content, artifact.schema),
+                }))
+
+        # Submit before writing anything, so a rejected batch leaves no rows behind.
+        provider_batch_id = transport.submit(b"\n".join(lines) + b"\n") if lines else None
+        batch = BatchJob(
+            id=uuid.uuid4().hex,
+            status="submitted" if lines else "completed",
+            provider_batch_id=provider_batch_id,
+            requests=items,
+            job_ids=[job.id for job in jobs],
+            total=len(items) + len(cached),
+            succeeded=len(cached),
+            finished_at=None if lines else _now(),
+        )
+        db.add_all([batch, *jobs, *cached])
+        db.commit()
+        db.refresh(batch)
+    response_cache.invalidate(invalidated)
+    return batch
+
+
+def _completion_text(record: dict) -> str:
+    if record.get("error"):
+        raise ValueError(record["error"].get("message") or str(record["error"]))
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        body = response.get("body") or {}
+        message = (body.get("error") or {}).get("message")
+        raise ValueError(message or f"Request failed with status {response.get('status_code')}")
+    return response["body"]["choices"][0]["message"]["content"] or ""
+
+
+def _claimable():
+    stale = _now() - timedelta(seconds=BATCH_STALE_SECONDS)
+    return or_(
+        BatchJob.status == "submitted",
+        (BatchJob.status == "processing") & (BatchJob.claimed_at < stale),
+    )
+
+
+def _apply_results(batch_id: str, result: BatchResult) -> bool:
+    """Store every successful item of a completed batch as an artifact.
+
+    Returns False if another process is storing the results right now, so
+    the caller should check again later; True once the batch is finished.
+    """
+    with SessionLocal() as db:
+        # Every worker polls unfinished batches; only the one that claims it fans out.
+        claimed = db.execute(
+            update(BatchJob)
+            .where(BatchJob.id == batch_id, _claimable())
+            .values(status="processing", claimed_at=_now())
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return db.scalar(select(BatchJob.status).where(BatchJob.id == batch_id)) != "processing"
+        batch = db.get(BatchJob, batch_id)
+        pending = {item["custom_id"]: item for item in batch.requests}
+        errors: list[dict] = []
+        invalidated: list[str] = []
+        cached: list[tuple[str, dict]] = []
+        succeeded = failed = 0
+
+        def record_failure(custom_id: str, detail: str) -> None:
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_BATCH_ERRORS:
+                errors.append({"custom_id": custom_id, "detail": detail})
+
+        # Detail for items left without a result because their line was unreadable.
+        missing = "No result returned for this request"
+        for line_no, line in enumerate((result.output + b"\n" + result.errors).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                detail = f"Invalid JSON: {e}"
+            else:
+                if isinstance(record, dict) and isinstance(record.get("custom_id"), str):
+                    detail = None
+                else:
+                    detail = "Expected a JSON object with a custom_id"
+            if detail is not None:
+                # The item it belonged to is unknown; it fails as unanswered below.
+                logger.warning("Unreadable result line %d in batch %s: %s", line_no, batch_id, detail)
+                missing = f"Result line unreadable: {detail}"
+                continue
+            item = pending.pop(record["custom_id"], None)
+            if item is None:
+                continue
+            kind = item["kind"]
+            try:
+                text = _completion_text(record)
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                record_failure(item["custom_id"], str(e) or "Malformed result line")
+                continue
+            try:
+                parsed = parse_output(ARTIFACT_TYPES[kind].schema, text)
+            except ValueError as e:
+                record_failure(item["custom_id"], f"AI output invalid: {e}")
+                continue
+            data = parsed.model_dump()
+            # The note or group may have been deleted while the batch ran;
+            # only that item fails.
+            try:
+                with db.begin_nested():
+                    db.add(_artifact_row(kind, item["note_id"], item["group_id"], data, item["source_hash"]))
+            except IntegrityError:
+                record_failure(item["custom_id"], "Note or group no longer exists")
+                continue
+            cached.append((item["cache_key"], data))
+            invalidated += artifact_keys(kind, item["note_id"], item["group_id"])
+            succeeded += 1
+        for custom_id in pending:
+            record_failure(custom_id, missing)
+
+        batch.succeeded += succeeded
+        batch.failed += failed
+        batch.errors = errors
+        batch.status = "completed"
+        batch.finished_at = _now()
+        db.commit()
+    for key, data in cached:
+        generation_cache.set(key, data)
+    response_cache.invalidate(invalidated)
+    return True
+
+
+def _fail_batch(batch_id: str, detail: str | None) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(BatchJob)
+            .where(BatchJob.id == batch_id, BatchJob.status.in_(("submitted", "processing")))
+            .values(status="failed", error=detail, failed=BatchJob.total - BatchJob.succeeded, finished_at=_now())
+        )
+        db.commit()
+
+
+def _unfinished_batches() -> list[tuple[str, str]]:
+    with SessionLocal() as db:
+        return db.execute(
+            select(BatchJob.id, BatchJob.provider_batch_id).where(
+                BatchJob.status.in_(("submitted", "processing"))
+            )
+        ).all()
+
+
+class BatchManager:
+    """Polls submitted batches and fans their results out when they complete."""
+
+    def __init__(self, transport=None, poll_seconds: float = BATCH_POLL_SECONDS):
+        self._transport = transport
+        self.poll_seconds = poll_seconds
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            self._transport = _transport_from_env()
+        return self._transport
+
+    def watch(self, batch_id: str, provider_batch_id: str) -> None:
+        if batch_id in self._tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self._watch(batch_id, provider_batch_id))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    async def resume(self) -> None:
+        """Resume polling batches left unfinished by a restart."""
+        for batch_id, provider_batch_id in await asyncio.to_thread(_unfinished_batches):
+            self.watch(batch_id, provider_batch_id)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _watch(self, batch_id: str, provider_batch_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                result = await asyncio.to_thread(self.transport.poll, provider_batch_id)
+            except (OpenAIError, OSError):
+                logger.warning("Polling batch %s failed; retrying", batch_id, exc_info=True)
+                continue
+            try:
+                if result.state == "completed":
+                    if not await asyncio.to_thread(_apply_results, batch_id, result):
+                        continue
+                elif result.state == "failed":
+                    await asyncio.to_thread(_fail_batch, batch_id, result.detail)
+                else:
+                    continue
+            except Exception:
+                logger.exception("Applying batch %s failed", batch_id)
+                await asyncio.to_thread(_fail_batch, batch_id, "Internal error")
+            return
+
+
+batch_manager = BatchManager()
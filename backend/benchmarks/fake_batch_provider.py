@@ -0,0 +1,130 @@
+"""Complete batches submitted through the file transport with canned results.
+
+Stands in for the OpenAI Batch API when the backend runs with
+BATCH_TRANSPORT=file: every ``<id>.input.jsonl`` in the batch directory
+without an output gets a ``<id>.output.jsonl`` in the Batch API's output
+format. Run it once, or with --watch alongside the server.
+
+    BATCH_TRANSPORT=file BATCH_POLL_SECONDS=1 uvicorn main:app
+    python benchmarks/fake_batch_provider.py --watch
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from artifacts import ARTIFACT_TYPES  # noqa: E402
+from batch import BATCH_FILE_DIR  # noqa: E402
+from openai_client import STUDY_PLAN_MERGE_PROMPT, STUDY_TOOLS_PROMPT  # noqa: E402
+
+PLAN_DAYS = 7
+
+
+def _topic(content: str) -> str:
+    words = content.split()
+    return " ".join(words[:6]) or "the material"
+
+
+def _canned(kind: str, topic: str, items: int) -> dict:
+    if kind == "flashcards":
+        return {"flashcards": [
+            {"question": f"Question {i + 1} about {topic}?", "answer": f"Answer {i + 1}."}
+            for i in range(items)
+        ]}
+    if kind == "quiz":
+        return {"quiz": [
+            {
+                "question": f"Question {i + 1} about {topic}?",
+                "choices": ["Option A", "Option B", "Option C", "Option D"],
+                "answer": "Option A",
+            }
+            for i in range(items)
+        ]}
+    return {"plan": [
+        {"day": i + 1, "focus": f"Review part {i + 1} of {topic}", "tasks": ["Read", "Self-test"]}
+        for i in range(PLAN_DAYS)
+    ]}
+
+
+def canned_output(system_prompt: str, content: str, items: int = 3) -> dict:
+    """A small valid output for whichever prompt the request used.
+
+    The same prompt and content always give the same output.
+    """
+    topic = _topic(content)
+    if system_prompt == STUDY_TOOLS_PROMPT:
+        kinds = list(ARTIFACT_TYPES)
+    elif system_prompt == STUDY_PLAN_MERGE_PROMPT:
+        kinds = ["study-plan"]
+    else:
+        kinds = [next((kind for kind, artifact in ARTIFACT_TYPES.items() if artifact.prompt == system_prompt), "study-plan")]
+    output: dict = {}
+    for kind in kinds:
+        output.update(_canned(kind, topic, items))
+    return output
+
+
+def _result_line(request: dict) -> str:
+    messages = request["body"]["messages"]
+    content = json.dumps(canned_output(messages[0]["content"], messages[1]["content"]))
+    return json.dumps({
+        "id": f"batch_req_{uuid.uuid4().hex}",
+        "custom_id": request["custom_id"],
+        "response": {
+            "status_code": 200,
+            "request_id": uuid.uuid4().hex,
+            "body": {
+                "object": "chat.completion",
+                "model": request["body"]["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+            },
+        },
+        "error": None,
+    })
+
+
+def complete_pending(directory: Path) -> int:
+    completed = 0
+    for path in sorted(directory.glob("*.input.jsonl")):
+        output = path.with_name(path.name.replace(".input.", ".output."))
+        if output.exists():
+            continue
+        lines = [_result_line(json.loads(line)) for line in path.read_text().splitlines() if line.strip()]
+        partial = output.with_suffix(".partial")
+        partial.write_text("\n".join(lines) + "\n")
+        # Renamed into place so the poller never reads a half-written file.
+        partial.replace(output)
+        completed += 1
+    return completed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=BATCH_FILE_DIR)
+    parser.add_argument("--watch", action="store_true", help="keep completing new batches")
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    directory = Path(args.dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    while True:
+        completed = complete_pending(directory)
+        if completed:
+            print(f"completed {completed} batch(es)")
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Serve a deterministic OpenAI-compatible chat completions API for load tests.
+
+Replies are the canned artifacts of ``fake_batch_provider.canned_output``,
+delivered after a fixed latency plus the completion's tokens at a set token
+rate, with usage reported like the real API. Streaming (including
+``stream_options.include_usage``) is supported. Failures are injected on a
+fixed schedule rather than at random, so two runs with the same settings see
+the same errors on the same request numbers.
+
+    python benchmarks/fake_openai.py --port 9100 --latency 0.4 --tokens-per-second 150 --error-rate 0.02
+    OPENAI_BASE_URL=http://localhost:9100/v1 OPENAI_API_KEY=fake uvicorn main:app --port 8001
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from compaction import count_tokens  # noqa: E402
+from fake_batch_provider import canned_output  # noqa: E402
+
+# Characters per streamed delta; roughly four tokens.
+STREAM_PIECE_CHARS = 16
+
+_ERRORS = {
+    429: ("rate_limit_exceeded", "requests", "Rate limit reached (injected)"),
+    500: ("server_error", "server_error", "The server had an error (injected)"),
+    503: ("service_unavailable", "server_error", "The engine is overloaded (injected)"),
+}
+
+
+@dataclass
+class Settings:
+    latency: float = 0.3
+    tokens_per_second: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    items: int = 5
+    seed: int = 0
+
+
+settings = Settings()
+stats = {"requests": 0, "failures": 0, "streams": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_request_numbers = itertools.count(1)
+
+app = FastAPI()
+
+
+def _fails(number: int) -> bool:
+    # Exactly error_rate of all requests fail, evenly spaced.
+    return int(number * settings.error_rate) != int((number - 1) * settings.error_rate)
+
+
+def _delay(number: int, tokens: int) -> tuple[float, float]:
+    """Seconds to the first token and seconds spent generating the rest."""
+    jitter = 1.0
+    if settings.jitter:
+        jitter += random.Random(settings.seed * 1_000_003 + number).uniform(-settings.jitter, settings.jitter)
+    generation = tokens / settings.tokens_per_second if settings.tokens_per_second else 0.0
+    return max(settings.latency * jitter, 0.0), generation
+
+
+def _error(status: int) -> JSONResponse:
+    code, kind, message = _ERRORS.get(status, _ERRORS[500])
+    return JSONResponse(
+        {"error": {"message": message, "type": kind, "param": None, "code": code}},
+        status_code=status,
+    )
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None, usage=None) -> str:
+    choices = [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+    }
+    if usage:
+        body["usage"] = usage
+    return f"data: {json.dumps(body)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    number = next(_request_numbers)
+    stats["requests"] += 1
+    if _fails(number):
+        stats["failures"] += 1
+        await asyncio.sleep(settings.latency / 10)
+        return _error(settings.error_status)
+
+    messages = body["messages"]
+    text = json.dumps(canned_output(messages[0]["content"], messages[1]["content"], settings.items))
+    usage = {
+        "prompt_tokens": sum(count_tokens(message["content"]) for message in messages),
+        "completion_tokens": count_tokens(text),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    stats["prompt_tokens"] += usage["prompt_tokens"]
+    stats["completion_tokens"] += usage["completion_tokens"]
+    first_token, generation = _delay(number, usage["completion_tokens"])
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "fake")
+
+    if body.get("stream"):
+        stats["streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        pieces = [text[i:i + STREAM_PIECE_CHARS] for i in range(0, len(text), STREAM_PIECE_CHARS)]
+
+        async def events():
+            await asyncio.sleep(first_token)
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for piece in pieces:
+                await asyncio.sleep(generation / len(pieces))
+                yield _chunk(completion_id, model, {"content": piece})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                yield _chunk(completion_id, model, {}, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(first_token + generation)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="completion token rate; 0 is instant")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency spread as a fraction, e.g. 0.2")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail, 0-1")
+    parser.add_argument("--error-status", type=int, choices=sorted(_ERRORS), default=429)
+    parser.add_argument("--items", type=int, default=settings.items, help="flashcards/quiz questions per reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings.latency = args.latency
+    settings.tokens_per_second = args.tokens_per_second
+    settings.jitter = args.jitter
+    settings.error_rate = args.error_rate
+    settings.error_status = args.error_status
+    settings.items = args.items
+    settings.seed = args.seed
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
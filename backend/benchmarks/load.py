@@ -0,0 +1,319 @@
+"""Drive every route family of a running backend and report latency as JSON.
+
+Seeds a corpus through the bulk import endpoint (N notes, M groups and K
+historical sets of each artifact per note and group), then runs each route
+family in turn at the given concurrency and reports requests, errors, RPS
+and p50/p95/p99 latency per route. Pass a previous report as --baseline to
+include the change against it. Point the backend at the fake provider so
+generation is deterministic:
+
+    python benchmarks/fake_openai.py --port 9100 --latency 0.3 --tokens-per-second 200
+    OPENAI_BASE_URL=http://localhost:9100/v1 OPENAI_API_KEY=fake uvicorn main:app --port 8001
+    python benchmarks/load.py --notes 500 --groups 50 --history 3 --concurrency 32 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from artifacts import ARTIFACT_TYPES  # noqa: E402
+from fake_batch_provider import canned_output  # noqa: E402
+
+FAMILIES = ("crud", "list", "latest", "history", "generate")
+KINDS = tuple(ARTIFACT_TYPES)
+
+_VOCABULARY = (
+    "cell membrane protein enzyme energy gradient transport signal pathway receptor "
+    "equation derivative integral limit vector matrix eigenvalue function series proof "
+    "market demand supply price elasticity cost revenue policy inflation interest "
+    "revolution empire treaty trade reform colony parliament war economy culture "
+    "algorithm graph tree sort search complexity memory cache thread process network"
+).split()
+
+
+# ── Corpus ────────────────────────────────────────────────
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(_VOCABULARY, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def note_content(rng: random.Random, words: int) -> str:
+    """Markdown-ish lecture notes of about ``words`` words."""
+    sections = []
+    written = 0
+    while written < words:
+        heading = " ".join(rng.choices(_VOCABULARY, k=2)).title()
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        sections.append(f"## {heading}\n\n{paragraph}")
+        written += len(paragraph.split()) + 2
+    return "\n\n".join(sections)
+
+
+def corpus_lines(notes: int, groups: int, history: int, group_size: int, words: int, seed: int):
+    """NDJSON records for the bulk import, in the order it reads them."""
+    rng = random.Random(seed)
+    contents = {}
+    for note_id in range(1, notes + 1):
+        contents[note_id] = note_content(rng, words)
+        yield {"type": "note", "id": note_id, "title": f"Lecture {note_id}", "content": contents[note_id]}
+    for group_id in range(1, groups + 1):
+        members = rng.sample(range(1, notes + 1), min(group_size, notes))
+        yield {"type": "group", "id": group_id, "name": f"Course {group_id}", "note_ids": members}
+    for owner, ids in (("note_id", range(1, notes + 1)), ("group_id", range(1, groups + 1))):
+        for owner_id in ids:
+            topic = contents.get(owner_id, "") if owner == "note_id" else f"course {owner_id}"
+            for kind in KINDS:
+                for _ in range(history):
+                    data = canned_output(ARTIFACT_TYPES[kind].prompt, topic)
+                    yield {"type": kind, owner: owner_id, "data": data}
+
+
+async def seed(client: httpx.AsyncClient, args) -> dict:
+    lines = corpus_lines(args.notes, args.groups, args.history, args.group_size, args.words, args.seed)
+    body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/notes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}, timeout=None
+    )
+    response.raise_for_status()
+    result = response.json()
+    return {
+        "notes": result["notes"],
+        "groups": result["groups"],
+        "artifacts": result["artifacts"],
+        "rejected": result["rejected"],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def _ids(client: httpx.AsyncClient, path: str) -> list[int]:
+    ids: list[int] = []
+    cursor = None
+    while True:
+        params = {"limit": 200, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get(path, params=params)).raise_for_status().json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids
+
+
+# ── Load ──────────────────────────────────────────────────
+
+
+class Recorder:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, method: str, route: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[route].append(time.perf_counter() - started)
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+
+Step = Callable[[Recorder, random.Random], Awaitable[None]]
+
+
+def _steps(notes: list[int], groups: list[int], fresh: bool) -> dict[str, Step]:
+    async def crud(r: Recorder, rng: random.Random) -> None:
+        response = await r.request(
+            "POST", "POST /api/notes", "/api/notes", json={"title": "Load test", "content": note_content(rng, 200)}
+        )
+        if response is None or response.status_code != 201:
+            return
+        note_id = response.json()["id"]
+        await r.request("GET", "GET /api/notes/{id}", f"/api/notes/{note_id}")
+        await r.request(
+            "PUT", "PUT /api/notes/{id}", f"/api/notes/{note_id}",
+            json={"title": "Load test (edited)", "content": note_content(rng, 200)},
+        )
+        await r.request("DELETE", "DELETE /api/notes/{id}", f"/api/notes/{note_id}")
+
+    async def listing(r: Recorder, rng: random.Random) -> None:
+        await r.request("GET", "GET /api/notes/summaries", "/api/notes/summaries", params={"limit": 50})
+        await r.request("GET", "GET /api/groups/summaries", "/api/groups/summaries", params={"limit": 50})
+        await r.request("GET", "GET /api/search", "/api/search", params={"q": rng.choice(_VOCABULARY)})
+        if groups:
+            await r.request("GET", "GET /api/groups/{id}", f"/api/groups/{rng.choice(groups)}")
+
+    async def latest(r: Recorder, rng: random.Random) -> None:
+        note_id = rng.choice(notes)
+        kind = rng.choice(KINDS)
+        await r.request("GET", f"GET /api/notes/{{id}}/{kind}/latest", f"/api/notes/{note_id}/{kind}/latest")
+        await r.request("GET", "GET /api/notes/{id}/study-tools", f"/api/notes/{note_id}/study-tools")
+        if groups:
+            group_id = rng.choice(groups)
+            await r.request("GET", f"GET /api/groups/{{id}}/{kind}/latest", f"/api/groups/{group_id}/{kind}/latest")
+
+    async def history(r: Recorder, rng: random.Random) -> None:
+        note_id = rng.choice(notes)
+        await r.request("GET", "GET /api/notes/{id}/flashcards/history", f"/api/notes/{note_id}/flashcards/history")
+
+    async def generate(r: Recorder, rng: random.Random) -> None:
+        params = {"fresh": "true"} if fresh else {}
+        kind = rng.choice(KINDS)
+        await r.request(
+            "POST", f"POST /api/notes/{{id}}/{kind}", f"/api/notes/{rng.choice(notes)}/{kind}", params=params
+        )
+        await r.request(
+            "POST", "POST /api/notes/{id}/study-tools", f"/api/notes/{rng.choice(notes)}/study-tools", params=params
+        )
+        if groups:
+            await r.request(
+                "POST", f"POST /api/groups/{{id}}/{kind}", f"/api/groups/{rng.choice(groups)}/{kind}", params=params
+            )
+
+    return {"crud": crud, "list": listing, "latest": latest, "history": history, "generate": generate}
+
+
+async def run_family(step: Step, recorder: Recorder, iterations: int, concurrency: int, seed: int) -> float:
+    """Run ``step`` ``iterations`` times across ``concurrency`` workers; return the elapsed seconds."""
+    remaining = iterations
+
+    async def worker(index: int) -> None:
+        nonlocal remaining
+        rng = random.Random(seed * 7919 + index)
+        while remaining > 0:
+            remaining -= 1
+            await step(recorder, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return time.perf_counter() - started
+
+
+# ── Report ────────────────────────────────────────────────
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = max(int(round(share * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors[route],
+            "rps": round(len(values) / elapsed, 2) if elapsed else None,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+            "statuses": {str(code): count for code, count in sorted(recorder.statuses[route].items())},
+        }
+    return routes
+
+
+def compare(routes: dict, baseline: dict) -> dict:
+    """Relative change per route against a previous report (positive is slower / more)."""
+    changes = {}
+    for route, current in routes.items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        changes[route] = {
+            metric: round((current[metric] - before[metric]) / before[metric], 4) if before[metric] else None
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "rps")
+        }
+    return changes
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        report: dict = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                key: getattr(args, key)
+                for key in ("base_url", "notes", "groups", "history", "group_size", "words",
+                            "concurrency", "requests", "families", "fresh", "seed")
+            },
+        }
+        if not args.skip_seed:
+            report["seed"] = await seed(client, args)
+        notes = await _ids(client, "/api/notes/summaries")
+        groups = await _ids(client, "/api/groups/summaries")
+        if not notes:
+            raise SystemExit("No notes to drive; seed first or drop --skip-seed")
+
+        steps = _steps(notes, groups, args.fresh)
+        report["families"] = {}
+        report["routes"] = {}
+        for family in args.families:
+            recorder = Recorder(client)
+            elapsed = await run_family(steps[family], recorder, args.requests, args.concurrency, args.seed)
+            routes = summarize(recorder, elapsed)
+            report["families"][family] = {
+                "seconds": round(elapsed, 3),
+                "requests": sum(route["requests"] for route in routes.values()),
+                "rps": round(sum(route["requests"] for route in routes.values()) / elapsed, 2),
+            }
+            report["routes"].update(routes)
+
+        if args.fake_openai_url:
+            report["fake_openai"] = (await client.get(f"{args.fake_openai_url.rstrip('/')}/stats")).json()
+    if args.baseline:
+        report["change"] = compare(report["routes"], json.loads(Path(args.baseline).read_text()))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--history", type=int, default=3, help="stored sets per artifact kind and owner")
+    parser.add_argument("--group-size", type=int, default=5)
+    parser.add_argument("--words", type=int, default=400, help="approximate words per seeded note")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="iterations per route family")
+    parser.add_argument("--families", nargs="+", choices=FAMILIES, default=list(FAMILIES))
+    parser.add_argument("--fresh", action="store_true", help="bypass the generation cache in the generate family")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="drive the data already in the database")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--fake-openai-url", help="include the fake provider's /stats in the report")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    parser.add_argument("--output", help="write the report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
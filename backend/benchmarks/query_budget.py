@@ -0,0 +1,77 @@
+"""Check SQL statement and loaded-byte budgets for the read endpoints.
+
+Seeds a throwaway SQLite database, calls each endpoint once and compares the
+number of SQL statements and ORM-loaded bytes with the budgets below. Exits
+non-zero when an endpoint goes over budget, so it can gate CI.
+
+    python benchmarks/query_budget.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_db_path = Path(tempfile.mkdtemp()) / "query_budget.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from main import app  # noqa: E402
+from models import FlashcardSet, Note, NoteGroup, QuizSet, StudyPlan  # noqa: E402
+from querystats import QueryStats  # noqa: E402
+
+NOTES = 20
+CONTENT_SIZE = 20_000
+
+# (method, path) -> (max statements, max ORM-loaded bytes)
+BUDGETS = {
+    ("GET", "/api/notes/summaries"): (1, 0),
+    ("GET", "/api/groups/summaries"): (1, 0),
+    ("GET", "/api/groups"): (2, NOTES * (CONTENT_SIZE + 200)),
+    ("GET", "/api/groups/1"): (2, NOTES * (CONTENT_SIZE + 200)),
+    ("GET", "/api/notes/1"): (1, CONTENT_SIZE + 200),
+    ("GET", "/api/notes/1/flashcards/latest"): (1, 1_000),
+    ("GET", "/api/notes/1/flashcards/history"): (1, 1_000),
+    ("GET", "/api/groups/1/flashcards/latest"): (1, 1_000),
+    ("GET", "/api/groups/1/quiz/latest"): (1, 1_000),
+    ("GET", "/api/groups/1/study-plan/latest"): (1, 1_000),
+    ("GET", "/api/notes/1/study-tools"): (1, 1_000),
+    ("GET", "/api/groups/1/study-tools"): (1, 3_000),
+}
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        notes = [Note(title=f"Note {i}", content="x" * CONTENT_SIZE) for i in range(NOTES)]
+        group = NoteGroup(name="Group", notes=notes)
+        db.add(group)
+        db.flush()
+        db.add_all([
+            FlashcardSet(note_id=notes[0].id, json_data={"flashcards": [{"question": "q", "answer": "a"}]}),
+            FlashcardSet(group_id=group.id, json_data={"flashcards": [{"question": "q", "answer": "a"}]}),
+            QuizSet(group_id=group.id, json_data={"quiz": [{"question": "q", "choices": ["a"], "answer": "a"}]}),
+            StudyPlan(group_id=group.id, json_data={"plan": [{"day": 1, "focus": "f", "tasks": ["t"]}]}),
+        ])
+        db.commit()
+
+
+def main() -> int:
+    seed()
+    client = TestClient(app)
+    failures = 0
+    print(f"{'endpoint':<42} {'status':>6} {'stmts':>6} {'bytes':>9}")
+    for (method, path), (max_statements, max_bytes) in BUDGETS.items():
+        with QueryStats() as stats:
+            response = client.request(method, path)
+        over = stats.count > max_statements or stats.bytes > max_bytes or response.status_code >= 400
+        failures += over
+        flag = "  OVER BUDGET" if over else ""
+        print(f"{method + ' ' + path:<42} {response.status_code:>6} {stats.count:>6} {stats.bytes:>9}{flag}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
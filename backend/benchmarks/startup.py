@@ -0,0 +1,50 @@
+"""Measure application startup against a database.
+
+Runs the startup schema step once on a new database (cold: tables created and
+every migration applied) and then repeatedly on the migrated one (warm:
+what every worker and replica pays on boot), reporting SQL statements and
+wall time. Uses a throwaway SQLite database unless DATABASE_URL is set;
+point it at a disposable Postgres database to see network round trips.
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'startup.db'}")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import engine  # noqa: E402
+from main import on_startup  # noqa: E402
+from querystats import QueryStats  # noqa: E402
+
+
+def measure() -> tuple[int, float]:
+    with QueryStats(engine) as stats:
+        started = time.perf_counter()
+        on_startup()
+        elapsed = time.perf_counter() - started
+    return len(stats.statements), elapsed * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="warm startups to time")
+    args = parser.parse_args()
+
+    statements, elapsed = measure()
+    print(f"{'cold':<6}{statements:>8} statements  {elapsed:>9.1f} ms")
+    warm = [measure() for _ in range(args.runs)]
+    print(
+        f"{'warm':<6}{warm[-1][0]:>8} statements  {statistics.median(ms for _, ms in warm):>9.1f} ms"
+        f"  (median of {args.runs})"
+    )
+
+
+if __name__ == "__main__":
+    main()
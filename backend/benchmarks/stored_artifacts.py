@@ -0,0 +1,108 @@
+"""Measure per-request CPU spent turning a stored artifact into a response body.
+
+Compares the previous read path (parse the JSON column, validate it with the
+output schema, then FastAPI's response_model validation, jsonable_encoder and
+json.dumps) with the current one (serve the stored text of a current
+schema-version row as-is). Runs on an in-memory payload, so it isolates
+serialization cost from the database.
+
+    python benchmarks/stored_artifacts.py --cards 50 --iterations 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# No database is touched; this only keeps importing the models cheap.
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from artifacts import SCHEMA_VERSION, stored_body, stored_items  # noqa: E402
+from schemas import FlashcardSetOut, FlashcardsOut  # noqa: E402
+
+_response_field = TypeAdapter(FlashcardsOut)
+_history_field = TypeAdapter(list[FlashcardSetOut])
+
+
+def validated_latest(raw: str) -> bytes:
+    result = FlashcardsOut.model_validate(json.loads(raw))
+    return json.dumps(jsonable_encoder(_response_field.validate_python(result))).encode("utf-8")
+
+
+def raw_latest(raw: str) -> bytes:
+    return stored_body("flashcards", SCHEMA_VERSION, raw)
+
+
+def validated_history(rows: list[tuple[int, str]]) -> bytes:
+    items = [
+        FlashcardSetOut(
+            id=row_id,
+            note_id=1,
+            created_at="2024-01-01T00:00:00Z",
+            flashcards=FlashcardsOut.model_validate(json.loads(raw)).flashcards,
+        )
+        for row_id, raw in rows
+    ]
+    return json.dumps(jsonable_encoder(_history_field.validate_python(items))).encode("utf-8")
+
+
+def raw_history(rows: list[tuple[int, str]]) -> bytes:
+    items = [
+        {
+            "id": row_id,
+            "note_id": 1,
+            "created_at": "2024-01-01T00:00:00Z",
+            "flashcards": stored_items("flashcards", SCHEMA_VERSION, raw),
+        }
+        for row_id, raw in rows
+    ]
+    return orjson.dumps(items)
+
+
+def cpu_per_call(fn, arg, iterations: int) -> float:
+    fn(arg)
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.process_time() - started) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=30)
+    parser.add_argument("--history", type=int, default=20, help="rows in the history response")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    cards = [
+        {"question": f"What is concept {i}? " * 3, "answer": f"Concept {i} is explained here. " * 4}
+        for i in range(args.cards)
+    ]
+    raw = json.dumps({"flashcards": cards})
+    rows = [(i, raw) for i in range(args.history)]
+
+    report = {}
+    for name, old, new, arg in (
+        ("latest", validated_latest, raw_latest, raw),
+        ("history", validated_history, raw_history, rows),
+    ):
+        before = cpu_per_call(old, arg, args.iterations)
+        after = cpu_per_call(new, arg, args.iterations)
+        report[name] = {
+            "validated_us": round(before * 1e6, 1),
+            "raw_us": round(after * 1e6, 1),
+            "saved_us": round((before - after) * 1e6, 1),
+            "speedup": round(before / after, 1) if after else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
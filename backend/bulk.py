@@ -0,0 +1,334 @@
+import asyncio
+import os
+import tempfile
+import uuid
+import zipfile
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterator
+from datetime import datetime, timezone
+from itertools import groupby
+from pathlib import PurePosixPath
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from artifacts import ARTIFACT_TYPES, SCHEMA_VERSION
+from database import SessionLocal
+from models import GenerationJob, Note, NoteGroup, note_group_members
+from schemas import ArtifactImport, GroupImport, ImportIssue, NoteImport
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_NOTE_BYTES = int(os.getenv("BULK_MAX_NOTE_BYTES", str(5 * 1024 * 1024)))
+
+# Only the first rejections are reported in detail; the rest are counted.
+MAX_IMPORT_ISSUES = 100
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+NOTE_SUFFIXES = {".md", ".markdown", ".txt"}
+
+# Zip archives need random access, so uploads are spooled (to disk past this size).
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _describe(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+class BulkImporter:
+    """Insert streamed notes, groups and artifacts in batched transactions.
+
+    Records may carry the ids they had in an export; groups and artifacts
+    that reference those ids are remapped to the newly inserted rows, so the
+    output of ``export_ndjson`` can be loaded into another database as-is.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int = BULK_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.note_ids: list[int] = []
+        self.counts = {"notes": 0, "groups": 0, "artifacts": 0}
+        self.rejected = 0
+        self.issues: list[ImportIssue] = []
+        self._notes: list[NoteImport] = []
+        self._artifacts: list[tuple[str, str, ArtifactImport, BaseModel]] = []
+        self._note_map: dict[int, int] = {}
+        self._group_map: dict[int, int] = {}
+
+    async def import_ndjson(self, body: AsyncIterator[bytes]) -> None:
+        line_no = 0
+        pending = bytearray()
+        # Set once the current line has been rejected for length; the rest of
+        # it is dropped until the next newline.
+        oversized = False
+        async for chunk in body:
+            *complete, rest = chunk.split(b"\n")
+            for part in complete:
+                line_no += 1
+                if oversized:
+                    oversized = False
+                    continue
+                pending += part
+                line = bytes(pending)
+                pending.clear()
+                if len(line) > BULK_MAX_NOTE_BYTES:
+                    self.reject(f"line {line_no}", f"Line is longer than {BULK_MAX_NOTE_BYTES} bytes")
+                else:
+                    await self._add_line(line_no, line)
+            if oversized:
+                continue
+            pending += rest
+            if len(pending) > BULK_MAX_NOTE_BYTES:
+                self.reject(f"line {line_no + 1}", f"Line is longer than {BULK_MAX_NOTE_BYTES} bytes")
+                pending.clear()
+                oversized = True
+        if pending:
+            await self._add_line(line_no + 1, bytes(pending))
+        await self.flush()
+
+    async def import_zip(self, body: AsyncIterator[bytes]) -> None:
+        """Import each markdown/text file as a note titled after its file name.
+
+        Raises zipfile.BadZipFile if the body is not a zip archive.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as spool:
+            async for chunk in body:
+                spool.write(chunk)
+            spool.seek(0)
+            with zipfile.ZipFile(spool) as archive:
+                for info in archive.infolist():
+                    path = PurePosixPath(info.filename)
+                    if info.is_dir() or path.parts[0] == "__MACOSX" or path.suffix.lower() not in NOTE_SUFFIXES:
+                        continue
+                    if info.file_size > BULK_MAX_NOTE_BYTES:
+                        self.reject(info.filename, f"File is larger than {BULK_MAX_NOTE_BYTES} bytes")
+                        continue
+                    data = await asyncio.to_thread(archive.read, info)
+                    try:
+                        content = data.decode("utf-8-sig")
+                    except UnicodeDecodeError:
+                        self.reject(info.filename, "File is not UTF-8 text")
+                        continue
+                    await self.add(info.filename, {"title": path.stem[:255], "content": content})
+        await self.flush()
+
+    async def add(self, location: str, record: dict) -> None:
+        kind = record.pop("type", "note")
+        if not isinstance(kind, str):
+            self.reject(location, "Record type must be a string")
+            return
+        try:
+            if kind == "note":
+                self._notes.append(NoteImport.model_validate(record))
+                if len(self._notes) >= self.batch_size:
+                    await self._flush_notes()
+            elif kind == "group":
+                await self._add_group(location, GroupImport.model_validate(record))
+            elif kind in ARTIFACT_TYPES:
+                item = ArtifactImport.model_validate(record)
+                data = ARTIFACT_TYPES[kind].schema.model_validate(item.data)
+                self._artifacts.append((location, kind, item, data))
+                if len(self._artifacts) >= self.batch_size:
+                    await self._flush_artifacts()
+            else:
+                self.reject(location, f"Unknown record type {kind!r}")
+        except ValidationError as e:
+            self.reject(location, _describe(e))
+
+    def reject(self, location: str, detail: str) -> None:
+        self.rejected += 1
+        if len(self.issues) < MAX_IMPORT_ISSUES:
+            self.issues.append(ImportIssue(location=location, detail=detail))
+
+    async def flush(self) -> None:
+        await self._flush_notes()
+        await self._flush_artifacts()
+
+    async def create_group(self, name: str) -> int:
+        """Create a group of every note imported so far and return its id."""
+        await self.flush()
+        group = NoteGroup(name=name)
+        self.db.add(group)
+        await self.db.flush()
+        await self._add_members(group.id, self.note_ids)
+        await self.db.commit()
+        self.counts["groups"] += 1
+        return group.id
+
+    async def _add_line(self, line_no: int, line: bytes) -> None:
+        if not line.strip():
+            return
+        location = f"line {line_no}"
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            self.reject(location, f"Invalid JSON: {e}")
+            return
+        if not isinstance(record, dict):
+            self.reject(location, "Expected a JSON object")
+            return
+        await self.add(location, record)
+
+    async def _flush_notes(self) -> None:
+        if not self._notes:
+            return
+        batch, self._notes = self._notes, []
+        rows = [
+            {"title": note.title, "content": note.content, "created_at": note.created_at or _now()}
+            for note in batch
+        ]
+        ids = (
+            await self.db.scalars(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows)
+        ).all()
+        await self.db.commit()
+        for note, new_id in zip(batch, ids):
+            if note.id is not None:
+                self._note_map[note.id] = new_id
+        self.note_ids.extend(ids)
+        self.counts["notes"] += len(ids)
+
+    async def _add_group(self, location: str, record: GroupImport) -> None:
+        await self._flush_notes()
+        unknown = [note_id for note_id in record.note_ids if note_id not in self._note_map]
+        if unknown:
+            self.reject(location, f"Unknown note ids: {unknown[:10]}")
+            return
+        group = NoteGroup(name=record.name, created_at=record.created_at or _now())
+        self.db.add(group)
+        await self.db.flush()
+        await self._add_members(group.id, [self._note_map[note_id] for note_id in record.note_ids])
+        await self.db.commit()
+        if record.id is not None:
+            self._group_map[record.id] = group.id
+        self.counts["groups"] += 1
+
+    async def _add_members(self, group_id: int, note_ids: list[int]) -> None:
+        unique = list(dict.fromkeys(note_ids))
+        for start in range(0, len(unique), self.batch_size):
+            await self.db.execute(
+                insert(note_group_members),
+                [{"group_id": group_id, "note_id": note_id} for note_id in unique[start:start + self.batch_size]],
+            )
+
+    async def _flush_artifacts(self) -> None:
+        if not self._artifacts:
+            return
+        # Artifacts may reference notes still waiting in the note batch.
+        await self._flush_notes()
+        batch, self._artifacts = self._artifacts, []
+        rows: dict[str, list[dict]] = defaultdict(list)
+        for location, kind, item, data in batch:
+            note_id = self._note_map.get(item.note_id) if item.note_id is not None else None
+            group_id = self._group_map.get(item.group_id) if item.group_id is not None else None
+            if note_id is None and group_id is None:
+                self.reject(location, "Unknown note or group id")
+                continue
+            rows[kind].append({
+                "note_id": note_id,
+                "group_id": group_id,
+                "json_data": data.model_dump(),
+                "schema_version": SCHEMA_VERSION,
+                "created_at": item.created_at or _now(),
+            })
+        for kind, kind_rows in rows.items():
+            await self.db.execute(insert(ARTIFACT_TYPES[kind].model), kind_rows)
+            self.counts["artifacts"] += len(kind_rows)
+        await self.db.commit()
+
+
+async def create_jobs(
+    db: AsyncSession, kinds: list[str], note_ids: list[int], group_id: int | None
+) -> list[str]:
+    """Queue a generation job per kind for the group, or for each note if there is none."""
+    owners = [(None, group_id)] if group_id is not None else [(note_id, None) for note_id in note_ids]
+    rows = [
+        {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "note_id": note_id,
+            "group_id": owner_group,
+            "fresh": False,
+            "status": "queued",
+            "claimed_at": _now(),
+        }
+        for note_id, owner_group in owners
+        for kind in dict.fromkeys(kinds)
+    ]
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        await db.execute(insert(GenerationJob), rows[start:start + BULK_BATCH_SIZE])
+    await db.commit()
+    return [row["id"] for row in rows]
+
+
+def _line(record: dict) -> bytes:
+    return orjson.dumps(record, option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+
+
+def _export_lines(batch_size: int) -> Iterator[bytes]:
+    # The request's session is closed by the time the body is streamed.
+    with SessionLocal() as db:
+        notes = db.execute(
+            select(Note.id, Note.title, Note.content, Note.created_at)
+            .order_by(Note.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for row in notes:
+            yield _line({"type": "note", **row._asdict()})
+
+        members = db.execute(
+            select(NoteGroup.id, NoteGroup.name, NoteGroup.created_at, note_group_members.c.note_id)
+            .outerjoin(note_group_members, note_group_members.c.group_id == NoteGroup.id)
+            .order_by(NoteGroup.id, note_group_members.c.note_id)
+            .execution_options(yield_per=batch_size)
+        )
+        for _, rows in groupby(members, key=lambda row: row.id):
+            rows = list(rows)
+            yield _line({
+                "type": "group",
+                "id": rows[0].id,
+                "name": rows[0].name,
+                "created_at": rows[0].created_at,
+                "note_ids": [row.note_id for row in rows if row.note_id is not None],
+            })
+
+        for kind, artifact in ARTIFACT_TYPES.items():
+            model = artifact.model
+            artifacts = db.execute(
+                select(model.id, model.note_id, model.group_id, model.created_at, model.json_data)
+                .order_by(model.id)
+                .execution_options(yield_per=batch_size)
+            )
+            for row in artifacts:
+                yield _line({
+                    "type": kind,
+                    "id": row.id,
+                    "note_id": row.note_id,
+                    "group_id": row.group_id,
+                    "created_at": row.created_at,
+                    "data": row.json_data,
+                })
+
+
+def export_ndjson(batch_size: int = BULK_BATCH_SIZE) -> Iterator[bytes]:
+    """Stream every note, group and artifact as NDJSON in the order ``BulkImporter`` reads them.
+
+    Rows are fetched ``batch_size`` at a time and lines are sent in ~64 KB
+    chunks, so memory stays flat however large the database is.
+    """
+    buffer = bytearray()
+    for line in _export_lines(batch_size):
+        buffer += line
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal
+from models import GenerationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv("GENERATION_CACHE_MEMORY_ENTRIES", "256"))
+CACHE_DB_ENTRIES = int(os.getenv("GENERATION_CACHE_DB_ENTRIES", "10000"))
+
+# Prune the durable tier every N writes rather than on each one.
+_PRUNE_EVERY = 50
+
+
+def cache_key(system_prompt: str, model: str, temperature: float, content: str) -> str:
+    payload = json.dumps([system_prompt, model, temperature, content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Two-tier cache of validated generation results.
+
+    The in-process LRU tier answers repeat requests without touching the
+    database; the DB tier survives restarts and is shared between workers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = CACHE_TTL_SECONDS,
+        memory_entries: int = CACHE_MEMORY_ENTRIES,
+        db_entries: int = CACHE_DB_ENTRIES,
+        session_factory=SessionLocal,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.db_entries = db_entries
+        self._session_factory = session_factory
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get(self, key: str) -> dict | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return data
+                del self._memory[key]
+                self._stats["evictions"] += 1
+
+        data = self._db_get(key)
+        with self._lock:
+            if data is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["db_hits"] += 1
+        self._remember(key, data)
+        return data
+
+    def set(self, key: str, data: dict) -> None:
+        self._remember(key, data)
+        with self._lock:
+            self._stats["writes"] += 1
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        self._db_set(key, data)
+        if prune:
+            self._db_prune()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        try:
+            with self._session_factory() as db:
+                db.execute(delete(GenerationCacheEntry))
+                db.commit()
+        except SQLAlchemyError:
+            logger.exception("Failed to clear generation cache table")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["db_hits"]
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, data: dict) -> None:
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl_seconds, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _db_get(self, key: str) -> dict | None:
+        now = datetime.now(timezone.utc)
+        try:
+            with self._session_factory() as db:
+                return db.execute(
+                    select(GenerationCacheEntry.json_data).where(
+                        GenerationCacheEntry.key == key,
+                        GenerationCacheEntry.expires_at > now,
+                    )
+                ).scalar_one_or_none()
+        except SQLAlchemyError:
+            # The cache must never turn a working generation into an error.
+            logger.exception("Generation cache lookup failed")
+            return None
+
+    def _db_set(self, key: str, data: dict) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            with self._session_factory() as db:
+                db.merge(
+                    GenerationCacheEntry(
+                        key=key,
+                        json_data=data,
+                        created_at=now,
+                        expires_at=now + timedelta(seconds=self.ttl_seconds),
+                    )
+                )
+                db.commit()
+        except SQLAlchemyError:
+            logger.exception("Generation cache write failed")
+
+    def _db_prune(self) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            with self._session_factory() as db:
+                expired = db.execute(
+                    delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= now)
+                ).rowcount
+                overflow = (
+                    select(GenerationCacheEntry.key)
+                    .order_by(GenerationCacheEntry.created_at.desc())
+                    .offset(self.db_entries)
+                )
+                evicted = db.execute(
+                    delete(GenerationCacheEntry).where(GenerationCacheEntry.key.in_(overflow))
+                ).rowcount
+                db.commit()
+        except SQLAlchemyError:
+            logger.exception("Generation cache prune failed")
+            return
+        with self._lock:
+            self._stats["evictions"] += (expired or 0) + (evicted or 0)
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,123 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAIError
+from pydantic import BaseModel
+
+from artifacts import ARTIFACT_TYPES, NOTE_SEPARATOR, ArtifactType
+from compaction import compact_documents, count_tokens, truncate_tokens
+from metrics import propagate_context
+from openai_client import STUDY_PLAN_MERGE_PROMPT, generate
+from schemas import StudyPlanOut
+
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "6000"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+
+# Split before markdown headings, or on blank lines.
+_SECTION_BREAK = re.compile(r"\n(?=#{1,6}\s)|\n\s*\n")
+
+
+def _split_text(text: str, budget: int) -> list[str]:
+    """Split one oversized document on section boundaries into budget-sized parts."""
+    sections = [s.strip() for s in _SECTION_BREAK.split(text) if s.strip()]
+    parts: list[str] = []
+    current: list[str] = []
+    size = 0
+    for section in sections:
+        while count_tokens(section) > budget:
+            # A single section larger than the budget is cut mid-section.
+            head = truncate_tokens(section, budget)
+            parts.append(head)
+            section = section[len(head):]
+        cost = count_tokens(section)
+        if current and size + cost > budget:
+            parts.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(section)
+        size += cost
+    if current:
+        parts.append("\n\n".join(current))
+    return parts
+
+
+def chunk_documents(documents: list[str], budget: int = CHUNK_TOKEN_BUDGET) -> list[str]:
+    """Compact documents and pack them into as few chunks as fit the token budget.
+
+    Paragraphs repeated across documents are sent once. Whole documents are
+    kept together where possible; only documents larger than the budget are
+    split. When everything fits, the single chunk is the same string the
+    unchunked path would send, so cache keys are unchanged.
+    """
+    documents = compact_documents(documents)
+    separator_cost = count_tokens(NOTE_SEPARATOR)
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for document in documents:
+        parts = [document] if count_tokens(document) <= budget else _split_text(document, budget)
+        for part in parts:
+            cost = count_tokens(part)
+            if current and size + separator_cost + cost > budget:
+                chunks.append(NOTE_SEPARATOR.join(current))
+                current, size = [], 0
+            current.append(part)
+            size += cost + separator_cost
+    if current:
+        chunks.append(NOTE_SEPARATOR.join(current))
+    return chunks
+
+
+def _question_key(item: dict) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(item.get("question", "")).lower()).strip()
+
+
+def merge_items(artifact: ArtifactType, results: list[BaseModel]) -> BaseModel:
+    """Concatenate the item lists of partial results, dropping repeated questions."""
+    seen: set[str] = set()
+    items: list[dict] = []
+    for result in results:
+        for item in result.model_dump()[artifact.items_key]:
+            key = _question_key(item)
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(item)
+    return artifact.schema.model_validate({artifact.items_key: items})
+
+
+def _plans_payload(results: list[BaseModel]) -> str:
+    return json.dumps([result.model_dump() for result in results])
+
+
+def _successes(outcomes: list) -> list[BaseModel]:
+    """Keep partial results; fail only if every chunk failed."""
+    failures = [o for o in outcomes if isinstance(o, BaseException)]
+    for failure in failures:
+        if not isinstance(failure, (ValueError, OpenAIError)):
+            raise failure
+    results = [o for o in outcomes if not isinstance(o, BaseException)]
+    if not results:
+        raise failures[0]
+    return results
+
+
+def generate_chunked(kind: str, documents: list[str], fresh: bool = False) -> BaseModel:
+    artifact = ARTIFACT_TYPES[kind]
+    chunks = chunk_documents(documents)
+    if len(chunks) == 1:
+        return generate(artifact.prompt, chunks[0], artifact.schema, fresh)
+
+    def run(chunk: str):
+        try:
+            return generate(artifact.prompt, chunk, artifact.schema, fresh)
+        except (ValueError, OpenAIError) as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(chunks))) as pool:
+        results = _successes(list(pool.map(propagate_context(run), chunks)))
+
+    if artifact.kind == "study-plan":
+        return generate(STUDY_PLAN_MERGE_PROMPT, _plans_payload(results), StudyPlanOut, fresh, compact=False)
+    return merge_items(artifact, results)
@@ -0,0 +1,158 @@
+import logging
+import os
+import re
+from functools import cache
+
+from metrics import record_tokens_saved
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on note tokens in one request; larger input is cut on
+# paragraph boundaries. Keep it above CHUNK_TOKEN_BUDGET so that chunked
+# input is never cut. 0 disables the limit.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+# tiktoken encoding used for counting when tiktoken and its encoding file
+# are available locally (see TIKTOKEN_CACHE_DIR); otherwise counts are estimated.
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+# Room left for the omission note when input is cut, and the share of the
+# budget kept for the outline of omitted sections.
+_NOTE_RESERVE = 40
+_OUTLINE_SHARE = 0.1
+
+_WORD = re.compile(r"\w+|[^\w\s]|\s{2,}|\n")
+_INNER_SPACE = re.compile(r"(?<=\S)[ \t]{2,}")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Paragraphs such as the "---" between group notes are kept even when repeated.
+_SEPARATOR_ONLY = re.compile(r"^[-*_=~\s]*$")
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"), None)
+
+
+@cache
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        logger.info("tiktoken encoding %s unavailable; estimating token counts", TOKEN_ENCODING)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` for the generation model.
+
+    Exact with tiktoken; otherwise an offline estimate that counts a token
+    per four characters of each word and one per punctuation mark, line
+    break or run of spaces, which tracks tiktoken closely on English prose.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum((len(word) + 3) // 4 if word[0].isalnum() or word[0] == "_" else 1 for word in _WORD.findall(text))
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """The longest prefix of ``text`` that is at most ``tokens`` tokens (at least one character)."""
+    encoding = _encoding()
+    if encoding is not None:
+        # A cut inside a multi-byte character decodes to a replacement character.
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:tokens]).rstrip("\ufffd")
+    else:
+        total = count_tokens(text)
+        head = text if total <= tokens else text[:len(text) * tokens // total]
+        # Prefer to end on a word boundary.
+        space = head.rfind(" ")
+        if len(head) < len(text) and space > len(head) // 2:
+            head = head[:space]
+    return head or text[:1]
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines; leading indentation is kept."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\u00a0", " ").translate(_INVISIBLE)
+    lines = [_INNER_SPACE.sub(" ", line.rstrip()) for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _dedupe(text: str, seen: set[str]) -> str:
+    kept: list[str] = []
+    for paragraph in text.split("\n\n"):
+        key = " ".join(paragraph.casefold().split())
+        if _SEPARATOR_ONLY.match(key):
+            # Separators around a note that was dropped entirely collapse into one.
+            if kept and _SEPARATOR_ONLY.match(kept[-1]):
+                continue
+        elif key in seen:
+            continue
+        else:
+            seen.add(key)
+        kept.append(paragraph)
+    return "\n\n".join(kept)
+
+
+def fit_budget(text: str, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Cut ``text`` to ``budget`` tokens, deterministically.
+
+    Whole paragraphs are kept from the start; the headings of the paragraphs
+    that did not fit are listed as an outline, and a note says how much was
+    left out. A first paragraph larger than the budget is cut mid-paragraph.
+    """
+    if budget <= 0 or count_tokens(text) <= budget:
+        return text
+    paragraphs = text.split("\n\n")
+    limit = max(budget - _NOTE_RESERVE, 1)
+    body_limit = max(int(limit * (1 - _OUTLINE_SHARE)), 1)
+    kept: list[str] = []
+    used = 0
+    for paragraph in paragraphs:
+        cost = count_tokens(paragraph) + 1
+        if used + cost > body_limit:
+            break
+        kept.append(paragraph)
+        used += cost
+    if not kept:
+        kept.append(truncate_tokens(paragraphs[0], body_limit))
+        used = body_limit
+    omitted = paragraphs[len(kept):]
+
+    headings: list[str] = []
+    for line in "\n".join(omitted).split("\n"):
+        heading = line.lstrip("#").strip() if line.startswith("#") else ""
+        if not heading:
+            continue
+        cost = count_tokens(heading) + 1
+        if used + cost > limit:
+            break
+        headings.append(heading)
+        used += cost
+    if headings:
+        kept.append("Omitted sections: " + "; ".join(headings))
+    kept.append(f"[{len(omitted)} more paragraphs omitted to fit the input budget]")
+    return "\n\n".join(kept)
+
+
+def compact(text: str, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Normalize whitespace, drop repeated paragraphs and enforce the token budget.
+
+    Idempotent, so already compacted input passes through unchanged.
+    """
+    compacted = fit_budget(_dedupe(normalize_whitespace(text), set()), budget)
+    if compacted != text:
+        record_tokens_saved(count_tokens(text) - count_tokens(compacted))
+    return compacted
+
+
+def compact_documents(documents: list[str]) -> list[str]:
+    """Compact each document, dropping paragraphs already seen in an earlier one.
+
+    Documents left empty are removed, unless that would remove them all.
+    """
+    seen: set[str] = set()
+    compacted = [_dedupe(normalize_whitespace(document), seen) for document in documents]
+    kept = [document for document in compacted if document] or compacted[:1]
+    if kept != documents:
+        record_tokens_saved(
+            sum(count_tokens(document) for document in documents) - sum(count_tokens(document) for document in kept)
+        )
+    return kept
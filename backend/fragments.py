@@ -0,0 +1,119 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAIError
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from artifacts import ARTIFACT_TYPES
+from chunking import CHUNK_CONCURRENCY, generate_chunked, merge_items
+from database import SessionLocal
+from metrics import propagate_context
+from models import NoteFragment
+
+# Artifacts whose items can be concatenated across notes. Study plans need a
+# global view of the material and are generated from the whole group instead.
+FRAGMENT_KINDS = ("flashcards", "quiz")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_fragments(
+    kind: str, notes: list[tuple[int, str]], fresh: bool
+) -> tuple[dict[int, dict], list[tuple[int, str]]]:
+    """Split notes into reusable fragments and notes that must be regenerated."""
+    if fresh:
+        return {}, notes
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(NoteFragment.note_id, NoteFragment.content_hash, NoteFragment.json_data).where(
+                NoteFragment.kind == kind,
+                NoteFragment.note_id.in_([note_id for note_id, _ in notes]),
+            )
+        ).all()
+    stored = {row.note_id: (row.content_hash, row.json_data) for row in rows}
+    fragments: dict[int, dict] = {}
+    stale: list[tuple[int, str]] = []
+    for note_id, content in notes:
+        hit = stored.get(note_id)
+        if hit and hit[0] == content_hash(content):
+            fragments[note_id] = hit[1]
+        else:
+            stale.append((note_id, content))
+    return fragments, stale
+
+
+def _save_fragments(kind: str, generated: dict[int, tuple[str, dict]]) -> None:
+    if not generated:
+        return
+    with SessionLocal() as db:
+        existing = {
+            row.note_id: row
+            for row in db.execute(
+                select(NoteFragment).where(
+                    NoteFragment.kind == kind, NoteFragment.note_id.in_(list(generated))
+                )
+            ).scalars()
+        }
+        for note_id, (digest, data) in generated.items():
+            row = existing.get(note_id)
+            if row is None:
+                db.add(NoteFragment(note_id=note_id, kind=kind, content_hash=digest, json_data=data))
+            else:
+                row.content_hash = digest
+                row.json_data = data
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request stored the same fragments first; theirs will do.
+            db.rollback()
+
+
+def _assemble(
+    kind: str,
+    notes: list[tuple[int, str]],
+    fragments: dict[int, dict],
+    stale: list[tuple[int, str]],
+    outcomes: list,
+) -> BaseModel:
+    artifact = ARTIFACT_TYPES[kind]
+    generated: dict[int, tuple[str, dict]] = {}
+    failures: list[BaseException] = []
+    for (note_id, content), outcome in zip(stale, outcomes):
+        if isinstance(outcome, (ValueError, OpenAIError)):
+            failures.append(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            generated[note_id] = (content_hash(content), outcome.model_dump())
+    _save_fragments(kind, generated)
+
+    parts = {**fragments, **{note_id: data for note_id, (_, data) in generated.items()}}
+    if not parts:
+        raise failures[0]
+    results = [
+        artifact.schema.model_validate(parts[note_id])
+        for note_id, _ in sorted(notes)
+        if note_id in parts
+    ]
+    return merge_items(artifact, results)
+
+
+def generate_group_artifact(kind: str, notes: list[tuple[int, str]], fresh: bool = False) -> BaseModel:
+    """Build a group artifact from per-note fragments, generating only changed notes."""
+    fragments, stale = _load_fragments(kind, notes, fresh)
+
+    def run(note: tuple[int, str]):
+        try:
+            return generate_chunked(kind, [note[1]], fresh)
+        except (ValueError, OpenAIError) as e:
+            return e
+
+    outcomes: list = []
+    if stale:
+        with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(stale))) as pool:
+            outcomes = list(pool.map(propagate_context(run), stale))
+    return _assemble(kind, notes, fragments, stale, outcomes)
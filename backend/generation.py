@@ -0,0 +1,129 @@
+import os
+import time
+from collections.abc import Callable
+from functools import partial
+
+from pydantic import BaseModel
+from sqlalchemy import func, select
+
+from artifacts import ARTIFACT_TYPES, SCHEMA_VERSION
+from chunking import generate_chunked
+from database import SessionLocal
+from fragments import FRAGMENT_KINDS, content_hash, generate_group_artifact
+from metrics import stage
+from response_cache import artifact_keys, response_cache
+from singleflight import LOCK_POLL_SECONDS, single_flight, try_advisory_lock
+
+# Seconds a request waits for another worker that is generating the same
+# artifact before giving up.
+GENERATION_LOCK_WAIT_SECONDS = float(os.getenv("GENERATION_LOCK_WAIT_SECONDS", "120"))
+
+
+def artifact_producer(
+    kind: str, notes: list[tuple[int, str]], fresh: bool, group: bool
+) -> Callable[[], BaseModel]:
+    """How an owner's artifact is generated from its ``(id, content)`` notes.
+
+    Group flashcards and quizzes are assembled from per-note fragments;
+    everything else goes through map-reduce chunking.
+    """
+    if group and kind in FRAGMENT_KINDS:
+        return partial(generate_group_artifact, kind, notes, fresh)
+    return partial(generate_chunked, kind, [content for _, content in notes], fresh)
+
+
+def _owner(model, note_id: int | None, group_id: int | None):
+    return model.note_id == note_id if note_id is not None else model.group_id == group_id
+
+
+def _latest_id(kind: str, note_id: int | None, group_id: int | None) -> int:
+    model = ARTIFACT_TYPES[kind].model
+    with SessionLocal() as db:
+        return db.scalar(select(func.max(model.id)).where(_owner(model, note_id, group_id))) or 0
+
+
+def _stored(
+    kind: str, note_id: int | None, group_id: int | None, digest: str, after_id: int
+) -> tuple[int, BaseModel] | None:
+    """The artifact for this input that a concurrent request stored after ``after_id``."""
+    artifact = ARTIFACT_TYPES[kind]
+    model = artifact.model
+    with SessionLocal() as db:
+        row = db.execute(
+            select(model.id, model.json_data)
+            .where(_owner(model, note_id, group_id), model.source_hash == digest, model.id > after_id)
+            .order_by(model.id.desc())
+            .limit(1)
+        ).first()
+    if row is None:
+        return None
+    return row.id, artifact.schema.model_validate(row.json_data)
+
+
+def store_artifact(kind: str, note_id: int | None, group_id: int | None, data: dict, digest: str) -> int:
+    """Store a generated artifact and invalidate the responses that embed it."""
+    with SessionLocal() as db:
+        row = ARTIFACT_TYPES[kind].model(
+            note_id=note_id,
+            group_id=group_id,
+            json_data=data,
+            source_hash=digest,
+            schema_version=SCHEMA_VERSION,
+        )
+        db.add(row)
+        db.flush()
+        row_id = row.id
+        db.commit()
+    response_cache.invalidate(artifact_keys(kind, note_id, group_id))
+    return row_id
+
+
+def generate_artifact(
+    kind: str,
+    source: str,
+    produce: Callable[[], BaseModel],
+    fresh: bool,
+    note_id: int | None = None,
+    group_id: int | None = None,
+) -> tuple[int, BaseModel]:
+    """Generate and store an artifact, coalescing identical concurrent requests.
+
+    Requests with the same artifact kind, owner and input share a single
+    generation: within a process through ``single_flight``, across workers
+    through an advisory lock. A request that finds the lock taken polls for
+    the row its holder stores and returns that instead of adding one, or
+    raises TimeoutError after ``GENERATION_LOCK_WAIT_SECONDS``. Lookups and
+    the insert use short sessions of their own, so no database connection is
+    held while the model runs. Returns the stored row's id and the result;
+    generation errors (ValueError, OpenAIError) propagate.
+    """
+    digest = content_hash(source)
+    key = f"{kind}:{note_id}:{group_id}:{digest}:{fresh}"
+
+    def run():
+        with stage("lookup"):
+            baseline = _latest_id(kind, note_id, group_id)
+        deadline = time.monotonic() + GENERATION_LOCK_WAIT_SECONDS
+        while True:
+            with try_advisory_lock(key) as acquired:
+                if acquired:
+                    with stage("lookup"):
+                        stored = _stored(kind, note_id, group_id, digest, baseline)
+                    if stored:
+                        return stored
+                    with stage("generate"):
+                        result = produce()
+                    with stage("persist"):
+                        row_id = store_artifact(kind, note_id, group_id, result.model_dump(), digest)
+                    return row_id, result
+            # Another worker is generating this artifact.
+            with stage("lookup"):
+                stored = _stored(kind, note_id, group_id, digest, baseline)
+            if stored:
+                return stored
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for a concurrent generation of this artifact")
+            with stage("wait"):
+                time.sleep(LOCK_POLL_SECONDS)
+
+    return single_flight.do(key, run)
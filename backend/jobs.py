@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from openai import OpenAIError
+from sqlalchemy import func, select, update
+
+from artifacts import NOTE_SEPARATOR, owner_notes
+from database import SessionLocal
+from generation import artifact_producer, generate_artifact
+from models import GenerationJob
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+# On shutdown, seconds to let queued and running jobs finish before the rest
+# are cancelled. Keep it below the server's graceful timeout.
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "60"))
+# A job is claimed when it is queued, and the process holding it renews the
+# claim every JOB_RECOVERY_INTERVAL. One still queued or running this long
+# after its last claim belongs to a process that stopped, and is resubmitted.
+# Keep it several times the interval.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+# Seconds between claim renewals and checks for such jobs; 0 disables both.
+JOB_RECOVERY_INTERVAL = int(os.getenv("JOB_RECOVERY_INTERVAL", "60"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def create_job(kind: str, note_id: int | None, group_id: int | None, fresh: bool) -> GenerationJob:
+    with SessionLocal() as db:
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            note_id=note_id,
+            group_id=group_id,
+            fresh=fresh,
+            status="queued",
+            claimed_at=_now(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+
+def _start_job(job_id: str) -> tuple[GenerationJob, list[tuple[int, str]] | None] | None:
+    """Claim a queued job and load its input; None if it was cancelled or claimed elsewhere."""
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+            .values(status="running", claimed_at=_now())
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        job = db.get(GenerationJob, job_id)
+        return job, owner_notes(db, job.note_id, job.group_id)
+
+
+def _finish_job(job_id: str, artifact_id: int, result: dict) -> None:
+    with SessionLocal() as db:
+        job = db.get(GenerationJob, job_id)
+        # Cancellation can arrive from another worker while the model runs.
+        if job is None or job.status != "running":
+            return
+        job.artifact_id = artifact_id
+        job.result = result
+        job.status = "succeeded"
+        job.finished_at = _now()
+        db.commit()
+
+
+def _requeue_job(job_id: str) -> None:
+    """Put a job interrupted by shutdown back in the queue for recovery to pick up."""
+    with SessionLocal() as db:
+        db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status.in_(ACTIVE_STATUSES))
+            .values(status="queued", claimed_at=None)
+        )
+        db.commit()
+
+
+def _renew_claims(job_ids: list[str]) -> None:
+    """Mark jobs this process still holds, queued or running, as claimed now."""
+    with SessionLocal() as db:
+        db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id.in_(job_ids), GenerationJob.status.in_(ACTIVE_STATUSES))
+            .values(claimed_at=_now())
+        )
+        db.commit()
+
+
+def _claim_stale_jobs(stale_seconds: int, exclude: set[str]) -> list[str]:
+    """Requeue jobs left queued or running by a process that stopped; returns their ids.
+
+    Jobs without a claim (requeued on shutdown, or queued before claims were
+    recorded) count from their creation.
+    """
+    stale = (
+        GenerationJob.status.in_(ACTIVE_STATUSES),
+        func.coalesce(GenerationJob.claimed_at, GenerationJob.created_at) < _now() - timedelta(seconds=stale_seconds),
+    )
+    claimed = []
+    with SessionLocal() as db:
+        for job_id in db.scalars(select(GenerationJob.id).where(*stale)):
+            if job_id in exclude:
+                continue
+            # Every worker looks for stale jobs; only one update matches each.
+            if db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, *stale)
+                .values(status="queued", claimed_at=_now())
+            ).rowcount:
+                claimed.append(job_id)
+        db.commit()
+    return claimed
+
+
+def _fail_job(job_id: str, status: str, error: str | None) -> None:
+    with SessionLocal() as db:
+        job = db.get(GenerationJob, job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return
+        job.status = status
+        job.error = error
+        job.finished_at = _now()
+        db.commit()
+
+
+class JobManager:
+    """Runs generation jobs on the event loop with a bounded level of concurrency."""
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._closing = False
+
+    def submit(self, job_id: str) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        task = asyncio.get_running_loop().create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def cancel(self, job_id: str) -> None:
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        await asyncio.to_thread(_fail_job, job_id, "cancelled", None)
+
+    async def recover(self, stale_seconds: int = JOB_STALE_SECONDS) -> None:
+        """Resubmit jobs that a stopped process left queued or running.
+
+        Claims on the jobs this process holds are renewed first.
+        """
+        held = list(self._tasks)
+        if held:
+            await asyncio.to_thread(_renew_claims, held)
+        job_ids = await asyncio.to_thread(_claim_stale_jobs, stale_seconds, set(held))
+        if job_ids:
+            logger.warning("Resubmitting %d interrupted generation jobs", len(job_ids))
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    async def run_recovery(self, interval: int = JOB_RECOVERY_INTERVAL) -> None:
+        """Recover interrupted jobs now and then every ``interval`` seconds."""
+        while True:
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Generation job recovery failed")
+            await asyncio.sleep(interval)
+
+    async def shutdown(self, drain_seconds: float = JOB_DRAIN_SECONDS) -> None:
+        """Wait up to ``drain_seconds`` for jobs in flight, then requeue the rest."""
+        self._closing = True
+        tasks = list(self._tasks.values())
+        if tasks and drain_seconds > 0:
+            logger.info("Draining %d generation jobs", len(tasks))
+            _, pending = await asyncio.wait(tasks, timeout=drain_seconds)
+            if pending:
+                logger.warning("Requeueing %d generation jobs still running after drain", len(pending))
+            tasks = list(pending)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            async with self._semaphore:
+                started = await asyncio.to_thread(_start_job, job_id)
+                if started is None:
+                    return
+                job, notes = started
+                if notes is None:
+                    await asyncio.to_thread(_fail_job, job_id, "failed", "Note or group not found")
+                    return
+                # Cancelling stops the wait; a generation already under way
+                # still completes and is stored for later requests.
+                artifact_id, result = await asyncio.to_thread(
+                    generate_artifact,
+                    job.kind,
+                    NOTE_SEPARATOR.join(content for _, content in notes),
+                    artifact_producer(job.kind, notes, job.fresh, group=job.group_id is not None),
+                    job.fresh,
+                    job.note_id,
+                    job.group_id,
+                )
+                await asyncio.to_thread(_finish_job, job_id, artifact_id, result.model_dump())
+        except asyncio.CancelledError:
+            if self._closing:
+                await asyncio.shield(asyncio.to_thread(_requeue_job, job_id))
+            else:
+                await asyncio.shield(asyncio.to_thread(_fail_job, job_id, "cancelled", None))
+            raise
+        except ValueError as e:
+            await asyncio.to_thread(_fail_job, job_id, "failed", f"AI output invalid: {e}")
+        except (OpenAIError, TimeoutError) as e:
+            await asyncio.to_thread(_fail_job, job_id, "failed", str(e))
+        except Exception:
+            logger.exception("Generation job %s crashed", job_id)
+            await asyncio.to_thread(_fail_job, job_id, "failed", "Internal error")
+
+
+job_manager = JobManager()
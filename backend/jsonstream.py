@@ -0,0 +1,48 @@
+import json
+
+
+class ItemStreamParser:
+    """Incrementally extract array items from a streamed ``{"key": [{...}, ...]}`` object.
+
+    Text is fed as it arrives; every object nested directly inside the
+    top-level array is returned as soon as its closing brace is seen.
+    Anything before the first ``{`` (such as a stray markdown fence) is
+    ignored.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item: list[str] = []
+
+    def feed(self, text: str) -> list[dict]:
+        items: list[dict] = []
+        for ch in text:
+            if self._depth >= 3:
+                self._item.append(ch)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = self._depth > 0
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 3 and ch == "{":
+                    self._item = [ch]
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 2 and ch == "}":
+                    try:
+                        items.append(json.loads("".join(self._item)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item = []
+        return items
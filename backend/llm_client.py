@@ -0,0 +1,150 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+import httpx
+from openai import APIConnectionError, APIStatusError, OpenAI, OpenAIError
+
+from shared_state import LocalState, shared_state
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_RETRY_BASE_SECONDS = float(os.getenv("OPENAI_RETRY_BASE_SECONDS", "0.5"))
+OPENAI_RETRY_MAX_SECONDS = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "30"))
+# Requests per second allowed towards the provider; 0 disables the limiter.
+OPENAI_RATE_LIMIT_RPS = float(os.getenv("OPENAI_RATE_LIMIT_RPS", "0"))
+OPENAI_RATE_LIMIT_BURST = int(os.getenv("OPENAI_RATE_LIMIT_BURST", "10"))
+
+
+class TokenBucket:
+    """Client-side rate limiter that queues callers instead of rejecting them.
+
+    Each caller reserves a token up front, possibly driving the balance
+    negative, and then sleeps until its token would have accrued. Callers are
+    therefore served in arrival order at the configured rate. The balance is
+    kept in shared state, so the rate holds across all worker processes; if
+    that is unreachable each process falls back to its own bucket.
+    """
+
+    def __init__(self, rate: float, capacity: int, key: str = "openai", state=shared_state):
+        self.rate = rate
+        self.capacity = capacity
+        self.key = key
+        self.state = state
+        self._fallback = LocalState()
+
+    def _reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        try:
+            return self.state.reserve(self.key, self.rate, self.capacity)
+        except Exception:
+            logger.warning("Shared rate limiter unavailable; limiting this process only", exc_info=True)
+            return self._fallback.reserve(self.key, self.rate, self.capacity)
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+
+
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is not set in environment")
+    return api_key
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+    )
+
+
+class ClientManager:
+    """Process-wide OpenAI clients sharing keep-alive connection pools.
+
+    The SDK's own retries are disabled; ``call_with_retries`` owns the policy
+    so that it can also respect the rate limiter.
+    """
+
+    def __init__(self, base_url: str | None = OPENAI_BASE_URL):
+        self.base_url = base_url
+        self._client: OpenAI | None = None
+        self._lock = threading.Lock()
+
+    def client(self) -> OpenAI:
+        with self._lock:
+            if self._client is None:
+                self._client = OpenAI(
+                    api_key=_api_key(),
+                    base_url=self.base_url,
+                    timeout=_timeout(),
+                    max_retries=0,
+                    http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                )
+            return self._client
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+client_manager = ClientManager()
+rate_limiter = TokenBucket(OPENAI_RATE_LIMIT_RPS, OPENAI_RATE_LIMIT_BURST)
+
+
+def _retryable(error: OpenAIError) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    # Covers connection resets and timeouts.
+    return isinstance(error, APIConnectionError)
+
+
+def _retry_delay(attempt: int, error: OpenAIError) -> float:
+    """Honour Retry-After when the server sends it, else full-jitter backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after_ms = response.headers.get("retry-after-ms")
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after_ms is not None:
+                return min(float(retry_after_ms) / 1000, OPENAI_RETRY_MAX_SECONDS)
+            if retry_after is not None:
+                return min(float(retry_after), OPENAI_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff.
+    ceiling = min(OPENAI_RETRY_MAX_SECONDS, OPENAI_RETRY_BASE_SECONDS * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+def call_with_retries(fn: Callable[..., T], *args, **kwargs) -> T:
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except OpenAIError as e:
+            if attempt == OPENAI_MAX_RETRIES or not _retryable(e):
+                raise
+            time.sleep(_retry_delay(attempt, e))
+    raise AssertionError("unreachable")
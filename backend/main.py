@@ -1,51 +1,184 @@
-from fastapi import Depends, FastAPI, HTTPException, status
-from sqlalchemy.orm import Session
-
-from sqlalchemy import inspect, text
-
-from database import Base, engine, get_db
-from models import FlashcardSet, Note, NoteGroup, QuizSet, StudyPlan
+import asyncio
+import zipfile
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from openai import OpenAIError
-from openai_client import create_flashcards, create_quiz, create_study_plan
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Text, cast, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from artifacts import (
+    ARTIFACT_TYPES,
+    GROUP_CONTENT,
+    NOTE_SEPARATOR,
+    stored_body,
+    stored_items,
+)
+from batch import batch_manager, create_batch
+from bulk import NDJSON_TYPES, ZIP_TYPES, BulkImporter, create_jobs, export_ndjson
+from cache import generation_cache
+from chunking import generate_chunked
+from database import async_engine, engine, get_async_db, get_db
+from fragments import content_hash
+from generation import artifact_producer, generate_artifact
+from jobs import ACTIVE_STATUSES, JOB_RECOVERY_INTERVAL, create_job, job_manager
+from llm_client import client_manager
+from metrics import MetricsMiddleware, instrument_engine, registry, stage
+from migrations import run_migrations
+from models import (
+    BatchJob,
+    GenerationJob,
+    Note,
+    NoteGroup,
+    NoteSignature,
+    note_group_members,
+)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, etag_response
+from response_cache import (
+    group_key,
+    latest_key,
+    note_key,
+    owner_keys,
+    response_cache,
+    study_tools_key,
+)
 from schemas import (
-    FlashcardSetOut,
+    ArtifactKind,
+    BatchCreate,
+    BatchOut,
+    BulkImportOut,
+    FlashcardHistoryPage,
     FlashcardsOut,
     GroupCreate,
     GroupOut,
+    GroupPage,
+    GroupSummary,
+    JobCreate,
+    JobOut,
     NoteCreate,
     NoteOut,
+    NotePage,
+    NoteSummary,
     NoteUpdate,
+    QuizHistoryPage,
     QuizOut,
+    SearchHit,
+    SearchPage,
+    SimilarNote,
+    StudyPlanHistoryPage,
     StudyPlanOut,
+    StudyToolsOut,
+)
+from retention import ARTIFACT_COMPACTION_INTERVAL, run_compaction
+from search import search_notes
+from similarity import (
+    SIMILARITY_THRESHOLD,
+    artifact_kinds_query,
+    backfill_signatures,
+    candidates_query,
+    index_statements,
+    is_empty,
+    rank,
+    reusable_match,
+    signature,
 )
+from singleflight import single_flight
+from streaming import artifact_event_stream
+from study_tools import generate_study_tools
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
+SNIPPET_LENGTH = 200
+
+_note_list = TypeAdapter(list[NoteOut])
+_group_list = TypeAdapter(list[GroupOut])
+
+# Background tasks that nothing awaits, referenced so they are not collected.
+_background_tasks: set[asyncio.Task] = set()
 
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    _add_group_id_columns()
-
-
-def _add_group_id_columns():
-    """Add group_id column to study tables if missing (no-op once applied)."""
-    inspector = inspect(engine)
-    tables = ["flashcard_sets", "quiz_sets", "study_plans"]
-    with engine.begin() as conn:
-        for table in tables:
-            if not inspector.has_table(table):
-                continue
-            columns = [c["name"] for c in inspector.get_columns(table)]
-            if "group_id" not in columns:
-                conn.execute(text(
-                    f"ALTER TABLE {table} ADD COLUMN group_id INTEGER "
-                    f"REFERENCES note_groups(id) ON DELETE CASCADE"
-                ))
-            if "note_id" in columns:
-                conn.execute(text(
-                    f"ALTER TABLE {table} ALTER COLUMN note_id DROP NOT NULL"
-                ))
+    run_migrations(engine)
+
+
+@app.on_event("startup")
+async def resume_batches():
+    await batch_manager.resume()
+
+
+@app.on_event("startup")
+async def resume_jobs():
+    if JOB_RECOVERY_INTERVAL > 0:
+        _background(job_manager.run_recovery())
+
+
+@app.on_event("startup")
+async def index_signatures():
+    _schedule_signature_backfill()
+
+
+@app.on_event("startup")
+async def compact_artifact_history():
+    if ARTIFACT_COMPACTION_INTERVAL > 0:
+        _background(run_compaction())
+
+
+def _background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _schedule_signature_backfill() -> None:
+    """Index unindexed notes in the background; notes are also indexed on demand."""
+    _background(run_in_threadpool(backfill_signatures))
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in list(_background_tasks):
+        task.cancel()
+    await job_manager.shutdown()
+    await batch_manager.shutdown()
+    client_manager.close()
+    await async_engine.dispose()
+
+
+def _generate_artifact(
+    kind: str,
+    source: str,
+    produce: Callable[[], BaseModel],
+    fresh: bool,
+    db: Session,
+    note_id: int | None = None,
+    group_id: int | None = None,
+):
+    """Generate and store an artifact through ``generate_artifact``, as an HTTP response.
+
+    The request's transaction is ended first so its connection goes back to
+    the pool for the duration of the model call; ``produce`` must not rely
+    on objects loaded through ``db``.
+    """
+    db.commit()
+    try:
+        _, result = generate_artifact(kind, source, produce, fresh, note_id=note_id, group_id=group_id)
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
+    except OpenAIError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return result
 
 
 @app.get("/api/health")
@@ -53,220 +186,496 @@ def health():
     return {"ok": True}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return generation_cache.stats()
+
+
+@app.get("/api/cache/responses/stats")
+def response_cache_stats():
+    return response_cache.stats()
+
+
+async def _aget_note_or_404(note_id: int, db: AsyncSession) -> Note:
+    note = await db.get(Note, note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return note
+
+
+async def _cached_json(key: str, build: Callable[[], Awaitable[bytes]]) -> Response:
+    """Serve the cached body for ``key``, building and storing it on a miss."""
+    body, token = response_cache.get(key)
+    if body is None:
+        body = await build()
+        response_cache.set(key, body, token)
+    return Response(content=body, media_type="application/json")
+
+
+async def _anote_group_keys(note_id: int, db: AsyncSession) -> list[str]:
+    """Cache keys of the groups whose responses embed this note."""
+    group_ids = await db.scalars(
+        select(note_group_members.c.group_id).where(note_group_members.c.note_id == note_id)
+    )
+    return [group_key(group_id) for group_id in group_ids]
+
+
 @app.post("/api/notes", response_model=NoteOut, status_code=status.HTTP_201_CREATED)
-def create_note(payload: NoteCreate, db: Session = Depends(get_db)):
+async def create_note(payload: NoteCreate, db: AsyncSession = Depends(get_async_db)):
     note = Note(title=payload.title, content=payload.content)
     db.add(note)
-    db.commit()
-    db.refresh(note)
+    await db.flush()
+    await _aindex_signature(note.id, note.content, db)
+    await db.commit()
+    await db.refresh(note)
     return note
 
 
+async def _aindex_signature(note_id: int, content: str, db: AsyncSession, sig=None) -> None:
+    """Update the note's similarity index entry in the current transaction."""
+    for statement in await run_in_threadpool(index_statements, note_id, content, sig):
+        await db.execute(statement)
+
+
+def _after_cursor(model, cursor: str):
+    """Keyset condition for rows after ``cursor`` in (created_at, id) DESC order.
+
+    The anchor's stored created_at is compared rather than the decoded value
+    so that the comparison uses the column's own representation; the
+    decoded value is only a fallback for an anchor that has been deleted.
+    """
+    created_at, row_id = decode_cursor(cursor)
+    anchor = select(model.created_at).where(model.id == row_id).scalar_subquery()
+    return tuple_(model.created_at, model.id) < tuple_(
+        func.coalesce(anchor, created_at), row_id
+    )
+
+
 @app.get("/api/notes", response_model=list[NoteOut])
-def list_notes(db: Session = Depends(get_db)):
-    return db.query(Note).order_by(Note.created_at.desc()).all()
+async def list_notes(request: Request, db: AsyncSession = Depends(get_async_db)):
+    notes = (await db.scalars(select(Note).order_by(Note.created_at.desc()))).all()
+    return etag_response(request, _note_list.dump_json(_note_list.validate_python(notes)))
+
+
+@app.post("/api/notes/bulk", response_model=BulkImportOut, status_code=status.HTTP_201_CREATED)
+async def bulk_import_notes(
+    request: Request,
+    group_name: str | None = Query(None, min_length=1, max_length=255),
+    generate: list[ArtifactKind] = Query([]),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Import an NDJSON stream (notes or a full export) or a zip of markdown files."""
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    importer = BulkImporter(db)
+    if media_type in NDJSON_TYPES:
+        await importer.import_ndjson(request.stream())
+    elif media_type in ZIP_TYPES:
+        try:
+            await importer.import_zip(request.stream())
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Body is not a valid zip archive")
+    else:
+        raise HTTPException(
+            status_code=415, detail="Send application/x-ndjson or application/zip"
+        )
+
+    group_id = None
+    if group_name and importer.note_ids:
+        group_id = await importer.create_group(group_name)
+    job_ids = await create_jobs(db, generate, importer.note_ids, group_id) if generate else []
+    for job_id in job_ids:
+        job_manager.submit(job_id)
+    if importer.note_ids:
+        _schedule_signature_backfill()
+    return BulkImportOut(
+        **importer.counts,
+        rejected=importer.rejected,
+        group_id=group_id,
+        job_ids=job_ids,
+        errors=importer.issues,
+    )
+
+
+@app.get("/api/export")
+def export_all():
+    return StreamingResponse(
+        export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="cognify-export.ndjson"'},
+    )
+
+
+@app.get("/api/notes/summaries", response_model=NotePage)
+async def list_note_summaries(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    query = select(
+        Note.id,
+        Note.title,
+        Note.created_at,
+        func.substr(Note.content, 1, SNIPPET_LENGTH).label("snippet"),
+    )
+    if cursor:
+        query = query.where(_after_cursor(Note, cursor))
+    rows = (await db.execute(
+        query.order_by(Note.created_at.desc(), Note.id.desc()).limit(limit + 1)
+    )).all()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    page = NotePage(
+        items=[NoteSummary.model_validate(row, from_attributes=True) for row in rows[:limit]],
+        next_cursor=next_cursor,
+    )
+    return etag_response(request, page.model_dump_json().encode("utf-8"))
+
+
+@app.get("/api/search", response_model=SearchPage)
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    rows = search_notes(db, q, limit + 1, offset)
+    return SearchPage(
+        items=[SearchHit.model_validate(row, from_attributes=True) for row in rows[:limit]],
+        next_offset=offset + limit if len(rows) > limit else None,
+    )
 
 
 @app.get("/api/notes/{note_id}", response_model=NoteOut)
-def get_note(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    return note
+async def get_note(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        note = await _aget_note_or_404(note_id, db)
+        return NoteOut.model_validate(note).model_dump_json().encode("utf-8")
+
+    return await _cached_json(note_key(note_id), build)
 
 
 @app.put("/api/notes/{note_id}", response_model=NoteOut)
-def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+async def update_note(note_id: int, payload: NoteUpdate, db: AsyncSession = Depends(get_async_db)):
+    note = await _aget_note_or_404(note_id, db)
     note.title = payload.title
     note.content = payload.content
-    db.commit()
-    db.refresh(note)
+    await _aindex_signature(note.id, note.content, db)
+    await db.commit()
+    await db.refresh(note)
+    response_cache.invalidate([note_key(note_id), *await _anote_group_keys(note_id, db)])
     return note
 
 
 @app.delete("/api/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_note(note_id: int, db: Session = Depends(get_db)):
+async def delete_note(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    note = await _aget_note_or_404(note_id, db)
+    group_keys = await _anote_group_keys(note_id, db)
+    await db.delete(note)
+    await db.commit()
+    response_cache.invalidate([*owner_keys(note_id=note_id), *group_keys])
+
+
+@app.get("/api/notes/{note_id}/similar", response_model=list[SimilarNote])
+async def list_similar_notes(
+    note_id: int,
+    threshold: float = Query(SIMILARITY_THRESHOLD, ge=0, le=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Near-duplicate notes by estimated word-shingle similarity, with their artifact kinds."""
+    note = await _aget_note_or_404(note_id, db)
+    sig = await run_in_threadpool(signature, note.content)
+    if is_empty(sig):
+        return []
+    # Notes written before indexing existed may not be in the index yet.
+    if await db.get(NoteSignature, note_id) is None:
+        await _aindex_signature(note_id, note.content, db, sig)
+        await db.commit()
+    rows = (await db.execute(candidates_query(note_id, sig))).all()
+    matches = rank(sig, rows, threshold, limit)
+    if not matches:
+        return []
+    kinds: dict[int, list[str]] = {match_id: [] for match_id, _, _ in matches}
+    for match_id, kind in await db.execute(artifact_kinds_query(list(kinds))):
+        kinds[match_id].append(kind)
+    return [
+        SimilarNote(id=match_id, title=title, similarity=score, artifacts=sorted(kinds[match_id]))
+        for match_id, title, score in matches
+    ]
+
+
+def _generate_note_artifact(
+    kind: str, note_id: int, fresh: bool, reuse_similar: bool, response: Response, db: Session
+):
+    """Generate a note's artifact, or copy a near-duplicate note's when asked to.
+
+    A near-duplicate that already has this kind of artifact is reported in
+    ``X-Similar-Note`` and ``X-Similarity``; with ``reuse_similar`` its latest
+    artifact is stored for this note instead of generating (``X-Reused-From``).
+    """
     note = db.query(Note).filter(Note.id == note_id).first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    db.delete(note)
-    db.commit()
+    content = note.content
+    artifact = ARTIFACT_TYPES[kind]
+
+    def generate():
+        return generate_chunked(kind, [content], fresh)
+
+    def reuse(match_id: int):
+        model = artifact.model
+        stored = db.scalar(
+            select(model.json_data)
+            .where(model.note_id == match_id)
+            .order_by(model.created_at.desc(), model.id.desc())
+            .limit(1)
+        )
+        db.commit()
+        # The match may have lost its artifacts since it was found.
+        if stored is None:
+            return generate()
+        return artifact.schema.model_validate(stored)
+
+    produce = generate
+    match = None
+    if not fresh:
+        with stage("similar"):
+            match = reusable_match(db, note_id, content, kind)
+    if match:
+        match_id, score = match
+        response.headers["X-Similarity"] = f"{score:.2f}"
+        if reuse_similar:
+            response.headers["X-Reused-From"] = str(match_id)
+            produce = partial(reuse, match_id)
+        else:
+            response.headers["X-Similar-Note"] = str(match_id)
+
+    return _generate_artifact(kind, content, produce, fresh, db, note_id=note_id)
 
 
 @app.post("/api/notes/{note_id}/flashcards", response_model=FlashcardsOut)
-def generate_flashcards(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    try:
-        result = create_flashcards(note.content)
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
-
-    flashcard_set = FlashcardSet(note_id=note.id, json_data=result.model_dump())
-    db.add(flashcard_set)
-    db.commit()
-
-    return result
+def generate_flashcards(
+    note_id: int,
+    response: Response,
+    fresh: bool = False,
+    reuse_similar: bool = False,
+    db: Session = Depends(get_db),
+):
+    return _generate_note_artifact("flashcards", note_id, fresh, reuse_similar, response, db)
 
 
 @app.get("/api/notes/{note_id}/flashcards/latest", response_model=FlashcardsOut)
-def get_latest_flashcards(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-
-    latest = (
-        db.query(FlashcardSet)
-        .filter(FlashcardSet.note_id == note_id)
-        .order_by(FlashcardSet.created_at.desc(), FlashcardSet.id.desc())
-        .first()
-    )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No flashcards found for this note")
-
-    try:
-        return FlashcardsOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored flashcards are invalid")
-
-
-@app.get("/api/notes/{note_id}/flashcards/history", response_model=list[FlashcardSetOut])
-def list_flashcard_history(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
+async def get_latest_flashcards(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["flashcards"], note_id=note_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No flashcards found for this note")
+        try:
+            return stored_body("flashcards", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored flashcards are invalid")
+
+    return await _cached_json(latest_key("flashcards", note_id=note_id), build)
+
+
+def _artifact_history(kind: str, note_id: int, limit: int, cursor: str | None, db: Session) -> Response:
+    """One page of a note's stored artifacts of ``kind``, newest first."""
+    artifact = ARTIFACT_TYPES[kind]
+    model = artifact.model
+    query = select(
+        model.id,
+        model.note_id,
+        model.created_at,
+        model.schema_version,
+        cast(model.json_data, Text).label("raw"),
+    ).where(model.note_id == note_id)
+    if cursor:
+        query = query.where(_after_cursor(model, cursor))
+    rows = db.execute(query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)).all()
+    if not rows and not db.query(Note.id).filter(Note.id == note_id).first():
         raise HTTPException(status_code=404, detail="Note not found")
 
-    history = (
-        db.query(FlashcardSet)
-        .filter(FlashcardSet.note_id == note_id)
-        .order_by(FlashcardSet.created_at.desc(), FlashcardSet.id.desc())
-        .all()
-    )
-
-    items: list[FlashcardSetOut] = []
-    for row in history:
+    items = []
+    for row in rows[:limit]:
         try:
-            validated = FlashcardsOut.model_validate(row.json_data)
+            data = stored_items(kind, row.schema_version, row.raw)
         except ValueError:
             # Skip corrupted historical rows instead of failing the endpoint.
             continue
         items.append(
-            FlashcardSetOut(
-                id=row.id,
-                note_id=row.note_id,
-                created_at=row.created_at,
-                flashcards=validated.flashcards,
-            )
+            {
+                "id": row.id,
+                "note_id": row.note_id,
+                "created_at": row.created_at,
+                artifact.items_key: data,
+            }
         )
-    return items
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    return Response(
+        content=orjson.dumps({"items": items, "next_cursor": next_cursor}, option=orjson.OPT_UTC_Z),
+        media_type="application/json",
+    )
 
 
-# ── Quiz endpoints ──────────────────────────────────────────────
+@app.get("/api/notes/{note_id}/flashcards/history", response_model=FlashcardHistoryPage)
+def list_flashcard_history(
+    note_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    return _artifact_history("flashcards", note_id, limit, cursor, db)
 
 
-@app.post("/api/notes/{note_id}/quiz", response_model=QuizOut)
-def generate_quiz(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    try:
-        result = create_quiz(note.content)
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
+# ── Quiz endpoints ──────────────────────────────────────────────
 
-    quiz_set = QuizSet(note_id=note.id, json_data=result.model_dump())
-    db.add(quiz_set)
-    db.commit()
 
-    return result
+@app.post("/api/notes/{note_id}/quiz", response_model=QuizOut)
+def generate_quiz(
+    note_id: int,
+    response: Response,
+    fresh: bool = False,
+    reuse_similar: bool = False,
+    db: Session = Depends(get_db),
+):
+    return _generate_note_artifact("quiz", note_id, fresh, reuse_similar, response, db)
 
 
 @app.get("/api/notes/{note_id}/quiz/latest", response_model=QuizOut)
-def get_latest_quiz(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+async def get_latest_quiz(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["quiz"], note_id=note_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No quiz found for this note")
+        try:
+            return stored_body("quiz", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored quiz is invalid")
 
-    latest = (
-        db.query(QuizSet)
-        .filter(QuizSet.note_id == note_id)
-        .order_by(QuizSet.created_at.desc(), QuizSet.id.desc())
-        .first()
-    )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No quiz found for this note")
+    return await _cached_json(latest_key("quiz", note_id=note_id), build)
 
-    try:
-        return QuizOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored quiz is invalid")
+
+@app.get("/api/notes/{note_id}/quiz/history", response_model=QuizHistoryPage)
+def list_quiz_history(
+    note_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    return _artifact_history("quiz", note_id, limit, cursor, db)
 
 
 # ── Study Plan endpoints ────────────────────────────────────────
 
 
 @app.post("/api/notes/{note_id}/study-plan", response_model=StudyPlanOut)
-def generate_study_plan(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    try:
-        result = create_study_plan(note.content)
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
-
-    plan = StudyPlan(note_id=note.id, json_data=result.model_dump())
-    db.add(plan)
-    db.commit()
-
-    return result
+def generate_study_plan(
+    note_id: int,
+    response: Response,
+    fresh: bool = False,
+    reuse_similar: bool = False,
+    db: Session = Depends(get_db),
+):
+    return _generate_note_artifact("study-plan", note_id, fresh, reuse_similar, response, db)
 
 
 @app.get("/api/notes/{note_id}/study-plan/latest", response_model=StudyPlanOut)
-def get_latest_study_plan(note_id: int, db: Session = Depends(get_db)):
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+async def get_latest_study_plan(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["study-plan"], note_id=note_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No study plan found for this note")
+        try:
+            return stored_body("study-plan", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored study plan is invalid")
 
-    latest = (
-        db.query(StudyPlan)
-        .filter(StudyPlan.note_id == note_id)
-        .order_by(StudyPlan.created_at.desc(), StudyPlan.id.desc())
-        .first()
-    )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No study plan found for this note")
+    return await _cached_json(latest_key("study-plan", note_id=note_id), build)
 
-    try:
-        return StudyPlanOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored study plan is invalid")
+
+@app.get("/api/notes/{note_id}/study-plan/history", response_model=StudyPlanHistoryPage)
+def list_study_plan_history(
+    note_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    return _artifact_history("study-plan", note_id, limit, cursor, db)
 
 
 # ── Group endpoints ─────────────────────────────────────────────
 
 
-def _get_group_or_404(group_id: int, db: Session) -> NoteGroup:
-    group = db.query(NoteGroup).filter(NoteGroup.id == group_id).first()
+def _get_group_or_404(group_id: int, db: Session, *options) -> NoteGroup:
+    group = db.query(NoteGroup).options(*options).filter(NoteGroup.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
     return group
 
 
-def _combined_content(group: NoteGroup) -> str:
+def _ensure_group_exists(group_id: int, db: Session) -> None:
+    if not db.query(NoteGroup.id).filter(NoteGroup.id == group_id).first():
+        raise HTTPException(status_code=404, detail="Group not found")
+
+
+def _latest_id(model, owner_clause):
+    return (
+        select(model.id)
+        .where(owner_clause)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def _alatest_artifacts(
+    db: AsyncSession, kinds: list[str], note_id: int | None = None, group_id: int | None = None
+) -> list:
+    """Fetch the owner's latest artifact of each kind in a single statement.
+
+    The owner row is the driving table, so a missing note or group is a 404
+    without a separate existence query. Each artifact comes back as
+    ``(schema_version, json_text)``, or None if the owner has none; the JSON is
+    read as text so current rows can be served without parsing.
+    Each lookup is an index probe on the (owner, created_at DESC, id DESC) index.
+    """
+    owner = Note if note_id is not None else NoteGroup
+    query = select(owner.id).where(owner.id == (note_id if note_id is not None else group_id))
+    for kind in kinds:
+        model = ARTIFACT_TYPES[kind].model
+        column = model.note_id if note_id is not None else model.group_id
+        latest_id = _latest_id(model, column == owner.id).correlate(owner)
+        query = query.add_columns(
+            model.schema_version, cast(model.json_data, Text).label(f"{model.__tablename__}_json")
+        ).outerjoin(model, model.id == latest_id)
+    row = (await db.execute(query)).first()
+    if row is None:
+        detail = "Note not found" if note_id is not None else "Group not found"
+        raise HTTPException(status_code=404, detail=detail)
+    return [None if raw is None else (version, raw) for version, raw in zip(row[1::2], row[2::2])]
+
+
+def _group_notes(group: NoteGroup) -> list[tuple[int, str]]:
     if not group.notes:
         raise HTTPException(status_code=400, detail="Group has no notes")
-    return "\n\n---\n\n".join(n.content for n in group.notes)
+    return [(n.id, n.content) for n in group.notes]
+
+
+def _documents(notes: list[tuple[int, str]]) -> list[str]:
+    return [content for _, content in notes]
+
+
+def _combined_content(notes: list[tuple[int, str]]) -> str:
+    return NOTE_SEPARATOR.join(_documents(notes))
 
 
 @app.post("/api/groups", response_model=GroupOut, status_code=status.HTTP_201_CREATED)
@@ -284,13 +693,54 @@ def create_group(payload: GroupCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/api/groups", response_model=list[GroupOut])
-def list_groups(db: Session = Depends(get_db)):
-    return db.query(NoteGroup).order_by(NoteGroup.created_at.desc()).all()
+def list_groups(request: Request, db: Session = Depends(get_db)):
+    groups = (
+        db.query(NoteGroup)
+        .options(selectinload(NoteGroup.notes))
+        .order_by(NoteGroup.created_at.desc())
+        .all()
+    )
+    return etag_response(request, _group_list.dump_json(_group_list.validate_python(groups)))
+
+
+@app.get("/api/groups/summaries", response_model=GroupPage)
+def list_group_summaries(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    note_count = (
+        select(func.count())
+        .select_from(note_group_members)
+        .where(note_group_members.c.group_id == NoteGroup.id)
+        .scalar_subquery()
+    )
+    query = select(NoteGroup.id, NoteGroup.name, NoteGroup.created_at, note_count.label("note_count"))
+    if cursor:
+        query = query.where(_after_cursor(NoteGroup, cursor))
+    rows = db.execute(
+        query.order_by(NoteGroup.created_at.desc(), NoteGroup.id.desc()).limit(limit + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    page = GroupPage(
+        items=[GroupSummary.model_validate(row, from_attributes=True) for row in rows[:limit]],
+        next_cursor=next_cursor,
+    )
+    return etag_response(request, page.model_dump_json().encode("utf-8"))
 
 
 @app.get("/api/groups/{group_id}", response_model=GroupOut)
-def get_group(group_id: int, db: Session = Depends(get_db)):
-    return _get_group_or_404(group_id, db)
+async def get_group(group_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        group = await db.get(NoteGroup, group_id, options=[selectinload(NoteGroup.notes)])
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        return GroupOut.model_validate(group).model_dump_json().encode("utf-8")
+
+    return await _cached_json(group_key(group_id), build)
 
 
 @app.delete("/api/groups/{group_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -298,105 +748,270 @@ def delete_group(group_id: int, db: Session = Depends(get_db)):
     group = _get_group_or_404(group_id, db)
     db.delete(group)
     db.commit()
+    response_cache.invalidate(owner_keys(group_id=group_id))
 
 
 @app.post("/api/groups/{group_id}/flashcards", response_model=FlashcardsOut)
-def generate_group_flashcards(group_id: int, db: Session = Depends(get_db)):
-    group = _get_group_or_404(group_id, db)
-    try:
-        result = create_flashcards(_combined_content(group))
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
+def generate_group_flashcards(group_id: int, fresh: bool = False, db: Session = Depends(get_db)):
+    notes = _group_notes(_get_group_or_404(group_id, db, GROUP_CONTENT))
+    return _generate_artifact(
+        "flashcards",
+        _combined_content(notes),
+        artifact_producer("flashcards", notes, fresh, group=True),
+        fresh,
+        db,
+        group_id=group_id,
+    )
 
-    flashcard_set = FlashcardSet(group_id=group.id, json_data=result.model_dump())
-    db.add(flashcard_set)
-    db.commit()
 
-    return result
+@app.get("/api/groups/{group_id}/flashcards/latest", response_model=FlashcardsOut)
+async def get_latest_group_flashcards(group_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["flashcards"], group_id=group_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No flashcards found for this group")
+        try:
+            return stored_body("flashcards", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored flashcards are invalid")
 
+    return await _cached_json(latest_key("flashcards", group_id=group_id), build)
 
-@app.get("/api/groups/{group_id}/flashcards/latest", response_model=FlashcardsOut)
-def get_latest_group_flashcards(group_id: int, db: Session = Depends(get_db)):
-    _get_group_or_404(group_id, db)
-    latest = (
-        db.query(FlashcardSet)
-        .filter(FlashcardSet.group_id == group_id)
-        .order_by(FlashcardSet.created_at.desc(), FlashcardSet.id.desc())
-        .first()
+
+@app.post("/api/groups/{group_id}/quiz", response_model=QuizOut)
+def generate_group_quiz(group_id: int, fresh: bool = False, db: Session = Depends(get_db)):
+    notes = _group_notes(_get_group_or_404(group_id, db, GROUP_CONTENT))
+    return _generate_artifact(
+        "quiz",
+        _combined_content(notes),
+        artifact_producer("quiz", notes, fresh, group=True),
+        fresh,
+        db,
+        group_id=group_id,
     )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No flashcards found for this group")
-    try:
-        return FlashcardsOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored flashcards are invalid")
 
 
-@app.post("/api/groups/{group_id}/quiz", response_model=QuizOut)
-def generate_group_quiz(group_id: int, db: Session = Depends(get_db)):
-    group = _get_group_or_404(group_id, db)
-    try:
-        result = create_quiz(_combined_content(group))
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
+@app.get("/api/groups/{group_id}/quiz/latest", response_model=QuizOut)
+async def get_latest_group_quiz(group_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["quiz"], group_id=group_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No quiz found for this group")
+        try:
+            return stored_body("quiz", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored quiz is invalid")
 
-    quiz_set = QuizSet(group_id=group.id, json_data=result.model_dump())
-    db.add(quiz_set)
+    return await _cached_json(latest_key("quiz", group_id=group_id), build)
+
+
+@app.post("/api/groups/{group_id}/study-plan", response_model=StudyPlanOut)
+def generate_group_study_plan(group_id: int, fresh: bool = False, db: Session = Depends(get_db)):
+    notes = _group_notes(_get_group_or_404(group_id, db, GROUP_CONTENT))
+    return _generate_artifact(
+        "study-plan",
+        _combined_content(notes),
+        artifact_producer("study-plan", notes, fresh, group=True),
+        fresh,
+        db,
+        group_id=group_id,
+    )
+
+
+@app.get("/api/groups/{group_id}/study-plan/latest", response_model=StudyPlanOut)
+async def get_latest_group_study_plan(group_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        [latest] = await _alatest_artifacts(db, ["study-plan"], group_id=group_id)
+        if not latest:
+            raise HTTPException(status_code=404, detail="No study plan found for this group")
+        try:
+            return stored_body("study-plan", *latest)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Stored study plan is invalid")
+
+    return await _cached_json(latest_key("study-plan", group_id=group_id), build)
+
+
+# ── Combined study tools ────────────────────────────────────────
+
+
+async def _astudy_tools(
+    db: AsyncSession, note_id: int | None = None, group_id: int | None = None
+) -> bytes:
+    kinds = ["flashcards", "quiz", "study-plan"]
+    rows = await _alatest_artifacts(db, kinds, note_id=note_id, group_id=group_id)
+    tools = {}
+    for kind, stored in zip(kinds, rows):
+        artifact = ARTIFACT_TYPES[kind]
+        tools[artifact.items_key] = None
+        if stored is None:
+            continue
+        try:
+            tools[artifact.items_key] = stored_items(kind, *stored)
+        except ValueError:
+            # An unreadable set is reported as missing rather than failing the other two.
+            pass
+    return orjson.dumps(tools)
+
+
+def _generate_study_tools(
+    source: str,
+    documents: list[str],
+    fresh: bool,
+    db: Session,
+    note_id: int | None = None,
+    group_id: int | None = None,
+) -> StudyToolsOut:
+    """Generate all three artifacts in one model call and store each one.
+
+    A part that could not be generated is returned as None; the request only
+    fails if none of them could.
+    """
+    # The model call can take a while; hand the request's connection back meanwhile.
     db.commit()
+    outcomes = single_flight.do(
+        f"study-tools:{note_id}:{group_id}:{content_hash(source)}:{fresh}",
+        lambda: generate_study_tools(documents, fresh),
+    )
+    tools = {}
+    errors = []
+    for kind, outcome in outcomes.items():
+        artifact = ARTIFACT_TYPES[kind]
+        if isinstance(outcome, Exception):
+            tools[artifact.items_key] = None
+            errors.append(outcome)
+            continue
+        stored = _generate_artifact(
+            kind, source, lambda outcome=outcome: outcome, fresh, db, note_id=note_id, group_id=group_id
+        )
+        tools[artifact.items_key] = getattr(stored, artifact.items_key)
+    if len(errors) == len(outcomes):
+        error = errors[0]
+        detail = f"AI output invalid: {error}" if isinstance(error, ValueError) else str(error)
+        raise HTTPException(status_code=502, detail=detail)
+    return StudyToolsOut(**tools)
 
-    return result
 
+@app.post("/api/notes/{note_id}/study-tools", response_model=StudyToolsOut)
+def generate_note_study_tools(note_id: int, fresh: bool = False, db: Session = Depends(get_db)):
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return _generate_study_tools(note.content, [note.content], fresh, db, note_id=note.id)
 
-@app.get("/api/groups/{group_id}/quiz/latest", response_model=QuizOut)
-def get_latest_group_quiz(group_id: int, db: Session = Depends(get_db)):
-    _get_group_or_404(group_id, db)
-    latest = (
-        db.query(QuizSet)
-        .filter(QuizSet.group_id == group_id)
-        .order_by(QuizSet.created_at.desc(), QuizSet.id.desc())
-        .first()
+
+@app.post("/api/groups/{group_id}/study-tools", response_model=StudyToolsOut)
+def generate_group_study_tools(group_id: int, fresh: bool = False, db: Session = Depends(get_db)):
+    notes = _group_notes(_get_group_or_404(group_id, db, GROUP_CONTENT))
+    return _generate_study_tools(
+        _combined_content(notes), _documents(notes), fresh, db, group_id=group_id
     )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No quiz found for this group")
-    try:
-        return QuizOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored quiz is invalid")
 
 
-@app.post("/api/groups/{group_id}/study-plan", response_model=StudyPlanOut)
-def generate_group_study_plan(group_id: int, db: Session = Depends(get_db)):
-    group = _get_group_or_404(group_id, db)
-    try:
-        result = create_study_plan(_combined_content(group))
-    except ValueError as e:
-        raise HTTPException(status_code=502, detail=f"AI output invalid: {e}")
-    except OpenAIError as e:
-        raise HTTPException(status_code=502, detail=str(e))
+@app.get("/api/notes/{note_id}/study-tools", response_model=StudyToolsOut)
+async def get_note_study_tools(note_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _cached_json(study_tools_key(note_id=note_id), lambda: _astudy_tools(db, note_id=note_id))
+
+
+@app.get("/api/groups/{group_id}/study-tools", response_model=StudyToolsOut)
+async def get_group_study_tools(group_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _cached_json(study_tools_key(group_id=group_id), lambda: _astudy_tools(db, group_id=group_id))
+
+
+# ── Streaming endpoints ─────────────────────────────────────────
+
 
-    plan_row = StudyPlan(group_id=group.id, json_data=result.model_dump())
-    db.add(plan_row)
+@app.post("/api/notes/{note_id}/{kind}/stream")
+def stream_note_artifact(
+    note_id: int, kind: ArtifactKind, fresh: bool = False, db: Session = Depends(get_db)
+):
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    notes = [(note_id, note.content)]
+    # The body streams for a while; give the request's connection back first.
     db.commit()
+    return artifact_event_stream(kind, notes, fresh, note_id=note_id)
 
-    return result
 
+@app.post("/api/groups/{group_id}/{kind}/stream")
+def stream_group_artifact(
+    group_id: int, kind: ArtifactKind, fresh: bool = False, db: Session = Depends(get_db)
+):
+    notes = _group_notes(_get_group_or_404(group_id, db, GROUP_CONTENT))
+    db.commit()
+    return artifact_event_stream(kind, notes, fresh, group_id=group_id)
 
-@app.get("/api/groups/{group_id}/study-plan/latest", response_model=StudyPlanOut)
-def get_latest_group_study_plan(group_id: int, db: Session = Depends(get_db)):
-    _get_group_or_404(group_id, db)
-    latest = (
-        db.query(StudyPlan)
-        .filter(StudyPlan.group_id == group_id)
-        .order_by(StudyPlan.created_at.desc(), StudyPlan.id.desc())
-        .first()
+
+# ── Job endpoints ───────────────────────────────────────────────
+
+
+def _check_job_owner(payload: JobCreate, db: Session) -> None:
+    if payload.note_id is not None:
+        if not db.get(Note, payload.note_id):
+            raise HTTPException(status_code=404, detail="Note not found")
+        return
+    _ensure_group_exists(payload.group_id, db)
+    has_notes = db.query(note_group_members.c.note_id).filter(
+        note_group_members.c.group_id == payload.group_id
+    ).first()
+    if not has_notes:
+        raise HTTPException(status_code=400, detail="Group has no notes")
+
+
+@app.post("/api/jobs", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(payload: JobCreate, db: Session = Depends(get_db)):
+    await run_in_threadpool(_check_job_owner, payload, db)
+    job = await run_in_threadpool(
+        create_job, payload.kind, payload.note_id, payload.group_id, payload.fresh
     )
-    if not latest:
-        raise HTTPException(status_code=404, detail="No study plan found for this group")
+    job_manager.submit(job.id)
+    return job
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobOut)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/api/jobs/{job_id}", response_model=JobOut)
+async def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    job = await run_in_threadpool(db.get, GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    await job_manager.cancel(job_id)
+    await run_in_threadpool(db.refresh, job)
+    return job
+
+
+# ── Batch endpoints ─────────────────────────────────────────────
+
+
+@app.post("/api/batch-generate", response_model=BatchOut, status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_batch(payload: BatchCreate):
     try:
-        return StudyPlanOut.model_validate(latest.json_data)
-    except ValueError:
-        raise HTTPException(status_code=500, detail="Stored study plan is invalid")
+        batch = await run_in_threadpool(create_batch, payload, batch_manager.transport)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OpenAIError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    for job_id in batch.job_ids:
+        job_manager.submit(job_id)
+    if batch.status == "submitted":
+        batch_manager.watch(batch.id, batch.provider_batch_id)
+    return batch
+
+
+@app.get("/api/batch-generate/{batch_id}", response_model=BatchOut)
+def get_generation_batch(batch_id: str, db: Session = Depends(get_db)):
+    batch = db.get(BatchJob, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
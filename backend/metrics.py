@@ -0,0 +1,378 @@
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPENAI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+T = TypeVar("T")
+
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Statement verbs reported as their own label; anything else is "OTHER".
+_QUERY_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: a count per bucket (plus +Inf), then the sum.
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        lines = self.header()
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket = _labels(self.label_names, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A gauge read at scrape time from a callback returning ``{label values: value}``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], collect: Callable[[], dict]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in self.collect().items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "cognify_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+stage_seconds = registry.register(Histogram(
+    "cognify_stage_duration_seconds",
+    "Time spent in each traced stage of request handling.",
+    ("stage",),
+))
+openai_request_seconds = registry.register(Histogram(
+    "cognify_openai_request_duration_seconds",
+    "OpenAI completion latency, including client retries.",
+    ("artifact", "outcome"),
+    buckets=OPENAI_BUCKETS,
+))
+openai_tokens = registry.register(Counter(
+    "cognify_openai_tokens_total",
+    "Tokens reported in OpenAI usage.",
+    ("artifact", "type"),
+))
+openai_errors = registry.register(Counter(
+    "cognify_openai_errors_total",
+    "OpenAI calls that raised, by error class.",
+    ("artifact", "error"),
+))
+db_query_seconds = registry.register(Histogram(
+    "cognify_db_query_duration_seconds",
+    "SQL statement execution time at the cursor.",
+    ("engine", "statement"),
+    buckets=QUERY_BUCKETS,
+))
+prompt_tokens_saved = registry.register(Counter(
+    "cognify_prompt_tokens_saved_total",
+    "Note tokens removed by prompt compaction before generation.",
+))
+db_query_errors = registry.register(Counter(
+    "cognify_db_query_errors_total",
+    "SQL statements that raised.",
+    ("engine",),
+))
+
+# ── Tracing ───────────────────────────────────────────────
+
+
+class Trace:
+    """Stage durations of one request, summed per stage name."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def save_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens_saved += tokens
+
+    def server_timing(self) -> str:
+        """A ``Server-Timing`` header value, in milliseconds."""
+        with self._lock:
+            stages = dict(self.stages)
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("cognify_trace", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a named stage of the current request.
+
+    Works on the event loop and in threadpool calls made from a request,
+    which inherit its context, and in pool threads running functions wrapped
+    with ``propagate_context``; outside a request only the histogram is fed.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def propagate_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap ``fn`` to run in a copy of the caller's context.
+
+    Threads of a ``ThreadPoolExecutor`` do not inherit context variables, so
+    stages timed in work submitted to one would be missing from the request.
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs) -> T:
+        # One copy per call: a context cannot be entered by two threads at once.
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+@contextmanager
+def openai_call(artifact: str) -> Iterator[None]:
+    """Time an OpenAI call as the ``openai`` stage and count its failures."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with stage("openai"):
+            yield
+        outcome = "ok"
+    except Exception as e:
+        openai_errors.inc(artifact=artifact, error=type(e).__name__)
+        raise
+    finally:
+        openai_request_seconds.observe(time.perf_counter() - started, artifact=artifact, outcome=outcome)
+
+
+def record_usage(artifact: str, usage) -> None:
+    """Count the tokens in a completion's ``usage``, if it reported any."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        count = getattr(usage, kind, None)
+        if count:
+            openai_tokens.inc(count, artifact=artifact, type=kind.removesuffix("_tokens"))
+
+
+def record_tokens_saved(tokens: int) -> None:
+    """Count prompt tokens removed by compaction, for the metric and the request."""
+    if tokens <= 0:
+        return
+    prompt_tokens_saved.inc(tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.save_tokens(tokens)
+
+
+class MetricsMiddleware:
+    """Time every HTTP request by route and attach a ``Server-Timing`` header.
+
+    Requests whose prompts were compacted also get ``X-Prompt-Tokens-Saved``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _current_trace.set(trace)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                if trace.tokens_saved:
+                    headers.append((b"x-prompt-tokens-saved", str(trace.tokens_saved).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - trace.started,
+                method=scope["method"],
+                # Unmatched paths share one label to keep cardinality bounded.
+                route=getattr(route, "path", "unmatched"),
+                status=status_code,
+            )
+
+
+# ── Database ──────────────────────────────────────────────
+
+
+def _statement_verb(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in _QUERY_VERBS else "OTHER"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Record statement timings and expose pool usage for ``engine``."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_seconds.observe(elapsed, engine=name, statement=_statement_verb(statement))
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        db_query_errors.inc(engine=name)
+
+    _pools.append((name, engine))
+
+
+_pools: list[tuple[str, Engine]] = []
+
+
+def _pool_usage() -> dict:
+    usage = {}
+    for name, engine in _pools:
+        pool = engine.pool
+        for state, reader in (("size", "size"), ("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+            # Only queue pools report usage; SQLite's in-memory pools do not.
+            if hasattr(pool, reader):
+                # overflow() counts down from zero while the pool is not full.
+                usage[(name, state)] = max(getattr(pool, reader)(), 0)
+    return usage
+
+
+registry.register(Gauge(
+    "cognify_db_pool_connections",
+    "Connection pool usage by state.",
+    ("engine", "state"),
+    _pool_usage,
+))
@@ -0,0 +1,214 @@
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from database import Base
+from models import FlashcardSet, QuizSet, RateLimitBucket, StudyPlan, data_hash
+from search import ensure_search_index
+from singleflight import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+ARTIFACT_MODELS = (FlashcardSet, QuizSet, StudyPlan)
+# Rows hashed per statement when backfilling artifact data hashes.
+_BACKFILL_BATCH = 500
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+# Changes to existing tables, including new indexes, need a migration; a new
+# table only needs one to trigger create_all. Migrations must tolerate a
+# schema create_all already brought up to date: a new database gets its
+# tables from the models and then runs every migration.
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Register ``apply(conn)`` as schema version ``version``."""
+
+    def register(apply: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, name, apply))
+        return apply
+
+    return register
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+@migration(1, "artifact json as jsonb")
+def _artifact_jsonb(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for model in ARTIFACT_MODELS:
+        table = model.__tablename__
+        data_type = conn.scalar(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = 'json'"
+            ),
+            {"table": table},
+        )
+        if data_type == "json":
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN json TYPE JSONB USING json::jsonb"))
+        for index in model.__table__.indexes:
+            if index.name == f"ix_{table}_json":
+                index.create(conn, checkfirst=True)
+
+
+@migration(2, "artifact data hash")
+def _artifact_data_hash(conn: Connection) -> None:
+    for model in ARTIFACT_MODELS:
+        table = model.__table__
+        if "data_hash" not in _columns(conn, table.name):
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN data_hash VARCHAR(64)"))
+        update = table.update().where(table.c.id == bindparam("row_id")).values(data_hash=bindparam("hash"))
+        while True:
+            rows = conn.execute(
+                select(table.c.id, table.c.json).where(table.c.data_hash.is_(None)).limit(_BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            conn.execute(update, [{"row_id": row.id, "hash": data_hash(row.json)} for row in rows])
+
+
+@migration(3, "artifact group ownership")
+def _artifact_group_ids(conn: Connection) -> None:
+    for model in ARTIFACT_MODELS:
+        table = model.__tablename__
+        columns = {column["name"]: column for column in inspect(conn).get_columns(table)}
+        if "group_id" not in columns:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN group_id INTEGER "
+                f"REFERENCES note_groups(id) ON DELETE CASCADE"
+            ))
+        # SQLite cannot relax a constraint in place; its tables have always
+        # been created from the current models, where note_id is nullable.
+        if conn.dialect.name == "postgresql" and not columns["note_id"]["nullable"]:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN note_id DROP NOT NULL"))
+
+
+# Columns added to the study tables after their first release.
+_ARTIFACT_COLUMNS = {
+    "source_hash": "VARCHAR(64)",
+    "schema_version": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+@migration(4, "artifact source hash and schema version")
+def _artifact_columns(conn: Connection) -> None:
+    for model in ARTIFACT_MODELS:
+        table = model.__tablename__
+        columns = _columns(conn, table)
+        for name, ddl in _ARTIFACT_COLUMNS.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+@migration(5, "indexes added after release")
+def _missing_indexes(conn: Connection) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+@migration(6, "note search index")
+def _search_index(conn: Connection) -> None:
+    ensure_search_index(conn)
+
+
+@migration(7, "shared rate limit buckets")
+def _rate_limit_buckets(conn: Connection) -> None:
+    RateLimitBucket.__table__.create(conn, checkfirst=True)
+
+
+@migration(8, "generation job claims")
+def _job_claims(conn: Connection) -> None:
+    if "claimed_at" not in _columns(conn, "generation_jobs"):
+        conn.execute(text("ALTER TABLE generation_jobs ADD COLUMN claimed_at TIMESTAMP WITH TIME ZONE"))
+
+
+@migration(9, "batch job claims")
+def _batch_claims(conn: Connection) -> None:
+    if "claimed_at" not in _columns(conn, "batch_jobs"):
+        conn.execute(text("ALTER TABLE batch_jobs ADD COLUMN claimed_at TIMESTAMP WITH TIME ZONE"))
+
+
+def _applied(engine: Engine) -> set[int] | None:
+    """Applied versions, or None if the database has never been migrated."""
+    try:
+        with engine.connect() as conn:
+            return set(conn.scalars(select(schema_migrations.c.version)))
+    except DBAPIError:
+        return None
+
+
+def _pending(applied: set[int] | None) -> list[Migration]:
+    return sorted((m for m in MIGRATIONS if m.version not in (applied or ())), key=lambda m: m.version)
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Bring the schema up to date and return the versions applied.
+
+    When nothing is pending this is a single query, with no introspection.
+    Otherwise one process at a time migrates (under a Postgres advisory
+    lock): missing tables are created, then each pending migration is applied
+    and recorded in its own transaction.
+    """
+    started = time.perf_counter()
+    if not _pending(_applied(engine)):
+        logger.info(
+            "Schema is current (version %d), checked in %.1f ms",
+            max(m.version for m in MIGRATIONS),
+            (time.perf_counter() - started) * 1000,
+        )
+        return []
+    with advisory_lock("schema-migrations"):
+        # Another process may have migrated while this one waited.
+        pending = _pending(_applied(engine))
+        if pending:
+            with engine.begin() as conn:
+                Base.metadata.create_all(conn)
+                schema_migrations.create(conn, checkfirst=True)
+        for pending_migration in pending:
+            with engine.begin() as conn:
+                logger.info("Applying migration %d: %s", pending_migration.version, pending_migration.name)
+                pending_migration.apply(conn)
+                conn.execute(
+                    schema_migrations.insert().values(
+                        version=pending_migration.version, name=pending_migration.name
+                    )
+                )
+    logger.info(
+        "Applied migrations %s in %.1f ms",
+        [m.version for m in pending],
+        (time.perf_counter() - started) * 1000,
+    )
+    return [m.version for m in pending]
+
+
+if __name__ == "__main__":
+    # Run by gunicorn's master before it forks the workers.
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_migrations(engine)
@@ -1,16 +1,25 @@
+import hashlib
 from datetime import datetime
 
+import orjson
 from sqlalchemy import (
     JSON,
+    BigInteger,
+    Boolean,
     Column,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Table,
     Text,
+    UniqueConstraint,
     func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
@@ -26,6 +35,7 @@ note_group_members = Table(
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (Index("ix_notes_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -35,6 +45,20 @@ class Note(Base):
     )
 
 
+# Artifact sets are stored as JSONB on Postgres: smaller, parsed once on
+# write, and indexable.
+ARTIFACT_JSON = JSON().with_variant(JSONB(), "postgresql")
+
+
+def data_hash(data) -> str:
+    """Hash of an artifact's JSON, equal for identical sets."""
+    return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _data_hash(context) -> str:
+    return data_hash(context.get_current_parameters()["json"])
+
+
 class FlashcardSet(Base):
     __tablename__ = "flashcard_sets"
 
@@ -45,7 +69,10 @@ class FlashcardSet(Base):
     group_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("note_groups.id", ondelete="CASCADE"), nullable=True, index=True
     )
-    json_data: Mapped[dict] = mapped_column("json", JSON, nullable=False)
+    json_data: Mapped[dict] = mapped_column("json", ARTIFACT_JSON, nullable=False)
+    source_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    data_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=_data_hash)
+    schema_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -61,7 +88,10 @@ class QuizSet(Base):
     group_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("note_groups.id", ondelete="CASCADE"), nullable=True, index=True
     )
-    json_data: Mapped[dict] = mapped_column("json", JSON, nullable=False)
+    json_data: Mapped[dict] = mapped_column("json", ARTIFACT_JSON, nullable=False)
+    source_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    data_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=_data_hash)
+    schema_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -77,7 +107,10 @@ class StudyPlan(Base):
     group_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("note_groups.id", ondelete="CASCADE"), nullable=True, index=True
     )
-    json_data: Mapped[dict] = mapped_column("json", JSON, nullable=False)
+    json_data: Mapped[dict] = mapped_column("json", ARTIFACT_JSON, nullable=False)
+    source_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    data_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=_data_hash)
+    schema_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -85,6 +118,7 @@ class StudyPlan(Base):
 
 class NoteGroup(Base):
     __tablename__ = "note_groups"
+    __table_args__ = (Index("ix_note_groups_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -92,4 +126,133 @@ class NoteGroup(Base):
         DateTime(timezone=True), server_default=func.now()
     )
 
-    notes = relationship("Note", secondary=note_group_members, lazy="joined")
+    # Loaded per query (see artifacts.GROUP_CONTENT and the group endpoints);
+    # membership rows are removed by the database's ON DELETE CASCADE.
+    notes = relationship("Note", secondary=note_group_members, passive_deletes=True)
+
+
+class GenerationCacheEntry(Base):
+    __tablename__ = "generation_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    json_data: Mapped[dict] = mapped_column("json", JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    note_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    group_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("note_groups.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    fresh: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+    artifact_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    # When the process holding the job last claimed it: on queueing, on start,
+    # on each renewal while it is held, or on recovery from a process that
+    # stopped. Null once it is requeued on shutdown.
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class BatchJob(Base):
+    __tablename__ = "batch_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="submitted", index=True)
+    provider_batch_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    # One entry per submitted request: custom_id, kind, owner, source hash and cache key.
+    requests: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    job_ids: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    succeeded: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    errors: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    # When a process started storing the results; a stale claim is taken over.
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class NoteFragment(Base):
+    __tablename__ = "note_fragments"
+    __table_args__ = (UniqueConstraint("note_id", "kind"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    note_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    json_data: Mapped[dict] = mapped_column("json", JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class NoteSignature(Base):
+    """MinHash signature of a note's content, for near-duplicate lookups."""
+
+    __tablename__ = "note_signatures"
+
+    note_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True
+    )
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    signature: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class NoteSignatureBand(Base):
+    """One LSH band bucket of a note's signature; notes sharing a bucket are candidates."""
+
+    __tablename__ = "note_signature_bands"
+
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    note_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class RateLimitBucket(Base):
+    """Token-bucket state shared by all workers (see shared_state.PostgresState)."""
+
+    __tablename__ = "rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    # Seconds since the epoch, on the database clock.
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+# Latest-artifact lookups are a single descending probe on these.
+Index("ix_flashcard_sets_note_id_latest", FlashcardSet.note_id, FlashcardSet.created_at.desc(), FlashcardSet.id.desc())
+Index("ix_flashcard_sets_group_id_latest", FlashcardSet.group_id, FlashcardSet.created_at.desc(), FlashcardSet.id.desc())
+Index("ix_quiz_sets_note_id_latest", QuizSet.note_id, QuizSet.created_at.desc(), QuizSet.id.desc())
+Index("ix_quiz_sets_group_id_latest", QuizSet.group_id, QuizSet.created_at.desc(), QuizSet.id.desc())
+Index("ix_study_plans_note_id_latest", StudyPlan.note_id, StudyPlan.created_at.desc(), StudyPlan.id.desc())
+Index("ix_study_plans_group_id_latest", StudyPlan.group_id, StudyPlan.created_at.desc(), StudyPlan.id.desc())
+
+# Containment queries over stored sets (``json @> ...``); Postgres only.
+_JSONB_GIN = {"postgresql_using": "gin", "postgresql_ops": {"json": "jsonb_path_ops"}}
+Index("ix_flashcard_sets_json", FlashcardSet.json_data, **_JSONB_GIN).ddl_if(dialect="postgresql")
+Index("ix_quiz_sets_json", QuizSet.json_data, **_JSONB_GIN).ddl_if(dialect="postgresql")
+Index("ix_study_plans_json", StudyPlan.json_data, **_JSONB_GIN).ddl_if(dialect="postgresql")
@@ -1,15 +1,35 @@
-import json
+import logging
 import os
+from collections.abc import Iterator
+from functools import cache
 from pathlib import Path
 
 from dotenv import load_dotenv
-from openai import OpenAI
-from pydantic import ValidationError
+from openai import OpenAI, OpenAIError
+from pydantic import BaseModel, ValidationError
 
+from cache import cache_key, generation_cache
+from jsonstream import ItemStreamParser
+from llm_client import call_with_retries, client_manager
+from compaction import compact as compact_content
+from metrics import openai_call, record_usage, stage
+from repair import Repaired, extract_json, repair, repair_item
 from schemas import FlashcardsOut, QuizOut, StudyPlanOut
 
 load_dotenv(Path(__file__).parent / ".env", override=True)
 
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.3
+
+# Constrain replies to the output schemas (structured outputs). Turn off for
+# OpenAI-compatible servers without json_schema support.
+OPENAI_STRUCTURED_OUTPUTS = os.getenv("OPENAI_STRUCTURED_OUTPUTS", "1") != "0"
+# Follow-up calls that return an unusable reply's errors for correction.
+OPENAI_REPAIR_RETRIES = int(os.getenv("OPENAI_REPAIR_RETRIES", "1"))
+MAX_REPORTED_ERRORS = 10
+
 FLASHCARD_PROMPT = (
     "You are a flashcard generator. Given notes, respond with ONLY a JSON object "
     "in this exact format: "
@@ -34,54 +54,335 @@ STUDY_PLAN_PROMPT = (
     "No markdown, no extra text, only the JSON object."
 )
 
+STUDY_PLAN_MERGE_PROMPT = (
+    "You are a study planner. You are given several partial study plans as JSON, "
+    "each covering a different part of the same material. Merge them into a single "
+    "7-day study plan that covers all of the material. "
+    "Respond with ONLY a JSON object in this exact format: "
+    '{"plan": [{"day": 1, "focus": "Topic name", "tasks": ["task 1", "task 2"]}]} '
+    "Include exactly 7 days (day 1 through 7). Each day has a focus topic and 2-4 tasks. "
+    "No markdown, no extra text, only the JSON object."
+)
 
-def _get_client() -> OpenAI:
-    api_key = os.getenv("OPENAI_API_KEY", "")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY is not set in environment")
-    return OpenAI(api_key=api_key)
+STUDY_TOOLS_PROMPT = (
+    "You are a study assistant. Given notes, create flashcards, a multiple-choice quiz "
+    "and a 7-day study plan. Respond with ONLY a JSON object in this exact format: "
+    '{"flashcards": [{"question": "...", "answer": "..."}], '
+    '"quiz": [{"question": "...", "choices": ["choice 1", "choice 2", "choice 3", "choice 4"], "answer": "choice 1"}], '
+    '"plan": [{"day": 1, "focus": "Topic name", "tasks": ["task 1", "task 2"]}]} '
+    "Each quiz item must have exactly 4 choices as plain text (no A/B/C/D prefixes), and its "
+    "answer must be the EXACT full text of the correct choice. "
+    "The plan must include exactly 7 days (day 1 through 7), each with a focus topic and 2-4 tasks. "
+    "No markdown, no extra text, only the JSON object."
+)
 
 
-def _call_openai(system_prompt: str, content: str) -> dict:
-    """Send a prompt to OpenAI and return parsed JSON dict.
+_ARTIFACT_LABELS = {FlashcardsOut: "flashcards", QuizOut: "quiz", StudyPlanOut: "study-plan"}
 
-    Raises ValueError on non-JSON or empty responses.
-    """
-    client = _get_client()
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": content},
-        ],
-        temperature=0.3,
-    )
-    raw = response.choices[0].message.content or ""
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"AI returned non-JSON output: {e}. Raw: {raw[:200]}")
+CORRECTION_PROMPT = (
+    "Your previous reply could not be used: {errors}. "
+    "Respond again with ONLY the corrected JSON object in the same format."
+)
+
+
+def _get_client() -> OpenAI:
+    return client_manager.client()
+
+
+def _messages(system_prompt: str, content: str) -> list[dict]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
 
 
-def create_flashcards(content: str) -> FlashcardsOut:
-    data = _call_openai(FLASHCARD_PROMPT, content)
+def _validate(schema: type[BaseModel], data: dict):
     try:
-        return FlashcardsOut.model_validate(data)
+        return schema.model_validate(data)
     except ValidationError as e:
         raise ValueError(f"AI JSON did not match expected schema: {e}")
 
 
-def create_quiz(content: str) -> QuizOut:
-    data = _call_openai(QUIZ_PROMPT, content)
+def _strict(node):
+    """Adapt a Pydantic JSON schema to the rules of strict structured outputs."""
+    if isinstance(node, list):
+        return [_strict(value) for value in node]
+    if not isinstance(node, dict):
+        return node
+    node = {key: _strict(value) for key, value in node.items()}
+    if node.get("type") == "object" and "properties" in node:
+        node["required"] = list(node["properties"])
+        node["additionalProperties"] = False
+    return node
+
+
+@cache
+def response_format(*schemas: type[BaseModel]) -> dict:
+    """A ``response_format`` constraining the reply to the fields of ``schemas`` together."""
+    properties: dict = {}
+    defs: dict = {}
+    for schema in schemas:
+        json_schema = schema.model_json_schema()
+        properties.update(json_schema["properties"])
+        defs.update(json_schema.get("$defs", {}))
+    body = {"type": "object", "properties": properties}
+    if defs:
+        body["$defs"] = defs
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "_".join(schema.__name__ for schema in schemas),
+            "strict": True,
+            "schema": _strict(body),
+        },
+    }
+
+
+def _request(messages: list[dict], schemas: tuple[type[BaseModel], ...]) -> dict:
+    request = {"model": MODEL, "messages": messages, "temperature": TEMPERATURE}
+    if schemas and OPENAI_STRUCTURED_OUTPUTS:
+        request["response_format"] = response_format(*schemas)
+    return request
+
+
+def completion_request(system_prompt: str, content: str, *schemas: type[BaseModel]) -> dict:
+    """Chat completion parameters for a generation, shared by live and batch calls."""
+    return _request(_messages(system_prompt, content), schemas)
+
+
+def _artifact(schemas: tuple[type[BaseModel], ...]) -> str:
+    """Metrics label for a generation of ``schemas``."""
+    if len(schemas) > 1:
+        return "study-tools"
+    return _ARTIFACT_LABELS.get(schemas[0], schemas[0].__name__)
+
+
+def _check(schema: type[BaseModel], raw: str) -> Repaired:
     try:
-        return QuizOut.model_validate(data)
-    except ValidationError as e:
-        raise ValueError(f"AI JSON did not match expected schema: {e}")
+        with stage("parse"):
+            data = extract_json(raw)
+    except ValueError as e:
+        return Repaired(None, [str(e)])
+    with stage("validate"):
+        return repair(schema, data)
+
+
+def _summary(errors: list[str]) -> str:
+    return "; ".join(errors[:MAX_REPORTED_ERRORS])
+
 
+def _accept(schema: type[BaseModel], repaired: Repaired) -> BaseModel:
+    if repaired.errors:
+        logger.info("Dropped invalid %s output: %s", schema.__name__, _summary(repaired.errors))
+    return repaired.result
 
-def create_study_plan(content: str) -> StudyPlanOut:
-    data = _call_openai(STUDY_PLAN_PROMPT, content)
+
+def _correction(request: dict, raw: str, errors: list[str]) -> dict:
+    """The original request followed by the rejected reply and only its errors."""
+    messages = request["messages"][:2] + [
+        {"role": "assistant", "content": raw},
+        {"role": "user", "content": CORRECTION_PROMPT.format(errors=_summary(errors))},
+    ]
+    return {**request, "messages": messages}
+
+
+def parse_output(schema: type[BaseModel], raw: str):
+    """Validate completion text against ``schema``, repairing it where possible.
+
+    Raises ValueError if nothing usable is left.
+    """
+    repaired = _check(schema, raw)
+    if repaired.result is None:
+        raise ValueError(_summary(repaired.errors))
+    return _accept(schema, repaired)
+
+
+def _complete(request: dict, artifact: str) -> str:
+    client = _get_client()
+    with openai_call(artifact):
+        response = call_with_retries(client.chat.completions.create, **request)
+    record_usage(artifact, getattr(response, "usage", None))
+    return response.choices[0].message.content or ""
+
+
+def _call_validated(system_prompt: str, content: str, schema: type[BaseModel]):
+    """Send a prompt to OpenAI and return the repaired, validated result.
+
+    A reply with nothing usable in it is sent back with its errors, at most
+    ``OPENAI_REPAIR_RETRIES`` times. Raises ValueError if no reply validates.
+    """
+    request = completion_request(system_prompt, content, schema)
+    for _ in range(OPENAI_REPAIR_RETRIES + 1):
+        raw = _complete(request, _artifact((schema,)))
+        repaired = _check(schema, raw)
+        if repaired.result is not None:
+            return _accept(schema, repaired)
+        request = _correction(request, raw, repaired.errors)
+    raise ValueError(_summary(repaired.errors))
+
+
+def _stream_openai(system_prompt: str, content: str, schema: type[BaseModel]) -> Iterator[str]:
+    """Yield completion text deltas as they arrive."""
+    client = _get_client()
+    artifact = _artifact((schema,))
+    with openai_call(artifact):
+        stream = call_with_retries(
+            client.chat.completions.create,
+            **completion_request(system_prompt, content, schema),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+    for chunk in stream:
+        # With include_usage the last chunk carries usage and no choices.
+        record_usage(artifact, getattr(chunk, "usage", None))
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _cached(key: str, schema: type[BaseModel]):
+    cached = generation_cache.get(key)
+    if cached is None:
+        return None
     try:
-        return StudyPlanOut.model_validate(data)
-    except ValidationError as e:
-        raise ValueError(f"AI JSON did not match expected schema: {e}")
+        return schema.model_validate(cached)
+    except ValidationError:
+        return None
+
+
+def prepare_content(content: str) -> str:
+    """Note content as it is sent: compacted and cut to ``PROMPT_TOKEN_BUDGET``."""
+    with stage("compact"):
+        return compact_content(content)
+
+
+def generate(
+    system_prompt: str, content: str, schema: type[BaseModel], fresh: bool = False, compact: bool = True
+):
+    """Return a validated result for the prompt, served from cache when possible.
+
+    Only validated output is cached, so a malformed completion is retried on
+    the next request instead of being replayed. ``fresh`` skips the lookup
+    but still refreshes the stored entry. Content is compacted first, and
+    the cache is keyed on what is sent; pass ``compact=False`` for input
+    that is not note text.
+    """
+    if compact:
+        content = prepare_content(content)
+    key = cache_key(system_prompt, MODEL, TEMPERATURE, content)
+    if not fresh:
+        result = _cached(key, schema)
+        if result is not None:
+            return result
+
+    result = _call_validated(system_prompt, content, schema)
+    generation_cache.set(key, result.model_dump())
+    return result
+
+
+def generate_combined(
+    system_prompt: str,
+    content: str,
+    parts: dict[str, tuple[str, type[BaseModel]]],
+    fresh: bool = False,
+) -> dict[str, BaseModel | Exception]:
+    """Generate several outputs with one call, keyed by their top-level field.
+
+    ``parts`` maps each field of the combined response to the prompt and
+    schema of the equivalent single-output generation. Each part is
+    validated on its own and cached under that single-output key, so it is
+    shared with ``generate``. Parts already cached are not requested again;
+    parts that fail validation are retried individually with ``generate``.
+    A failed part maps to its exception instead of failing the others.
+    """
+    content = prepare_content(content)
+    results: dict[str, BaseModel | Exception] = {}
+    keys = {field: cache_key(prompt, MODEL, TEMPERATURE, content) for field, (prompt, _) in parts.items()}
+    if not fresh:
+        for field, (_, schema) in parts.items():
+            result = _cached(keys[field], schema)
+            if result is not None:
+                results[field] = result
+
+    missing = [field for field in parts if field not in results]
+    if len(missing) > 1:
+        request = completion_request(system_prompt, content, *(parts[field][1] for field in missing))
+        try:
+            raw = _complete(request, _artifact(tuple(parts[field][1] for field in missing)))
+            with stage("parse"):
+                data = extract_json(raw)
+        except ValueError:
+            data = {}
+        except OpenAIError as e:
+            return {**results, **{field: e for field in missing}}
+        for field in missing:
+            schema = parts[field][1]
+            with stage("validate"):
+                repaired = repair(schema, {field: data.get(field)})
+            if repaired.result is None:
+                continue
+            result = _accept(schema, repaired)
+            generation_cache.set(keys[field], result.model_dump())
+            results[field] = result
+
+    for field in parts:
+        if field in results:
+            continue
+        prompt, schema = parts[field]
+        try:
+            results[field] = generate(prompt, content, schema, fresh)
+        except (ValueError, OpenAIError) as e:
+            results[field] = e
+    return results
+
+
+def generate_stream(
+    system_prompt: str,
+    content: str,
+    schema: type[BaseModel],
+    items_key: str,
+    item_schema: type[BaseModel],
+    fresh: bool = False,
+) -> Iterator[tuple[str, BaseModel]]:
+    """Yield ``("item", item)`` as each item completes, then ``("result", result)``.
+
+    Items that fail validation are dropped rather than failing the stream;
+    the assembled result is validated and cached like ``generate``.
+    """
+    content = prepare_content(content)
+    key = cache_key(system_prompt, MODEL, TEMPERATURE, content)
+    if not fresh:
+        cached = _cached(key, schema)
+        if cached is not None:
+            for item in getattr(cached, items_key):
+                yield "item", item
+            yield "result", cached
+            return
+
+    parser = ItemStreamParser()
+    items: list[BaseModel] = []
+    for delta in _stream_openai(system_prompt, content, schema):
+        for data in parser.feed(delta):
+            try:
+                item = repair_item(item_schema, data)
+            except ValueError:
+                continue
+            items.append(item)
+            yield "item", item
+
+    if not items:
+        raise ValueError("AI returned no valid items")
+    result = _validate(schema, {items_key: [item.model_dump() for item in items]})
+    generation_cache.set(key, result.model_dump())
+    yield "result", result
+
+
+def create_flashcards(content: str, fresh: bool = False) -> FlashcardsOut:
+    return generate(FLASHCARD_PROMPT, content, FlashcardsOut, fresh)
+
+
+def create_quiz(content: str, fresh: bool = False) -> QuizOut:
+    return generate(QUIZ_PROMPT, content, QuizOut, fresh)
+
+
+def create_study_plan(content: str, fresh: bool = False) -> StudyPlanOut:
+    return generate(STUDY_PLAN_PROMPT, content, StudyPlanOut, fresh)
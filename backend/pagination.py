@@ -0,0 +1,32 @@
+import base64
+import hashlib
+from datetime import datetime
+
+from fastapi import HTTPException, Request, Response
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def etag_response(request: Request, body: bytes) -> Response:
+    """Serve ``body`` with an ETag, or a bodiless 304 if the client already has it."""
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+    # no-cache makes browsers revalidate with If-None-Match on every fetch.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    candidates = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
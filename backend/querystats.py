@@ -0,0 +1,47 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import attributes
+
+from database import Base, async_engine, engine
+
+
+class QueryStats:
+    """Count SQL statements and ORM-loaded rows/bytes inside a ``with`` block.
+
+    Statements are counted at the cursor level, so lazy loads and flushes
+    are included. Rows and bytes cover ORM entities materialised by the
+    session; bytes is the summed size of their loaded column values, which is
+    what eager-loading mistakes (such as pulling every note's content) inflate.
+    """
+
+    def __init__(self, *engines: Engine):
+        self.engines = engines or (engine, async_engine.sync_engine)
+        self.statements: list[str] = []
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self) -> "QueryStats":
+        for bound in self.engines:
+            event.listen(bound, "after_cursor_execute", self._on_execute)
+        event.listen(Base, "load", self._on_load, propagate=True)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for bound in self.engines:
+            event.remove(bound, "after_cursor_execute", self._on_execute)
+        event.remove(Base, "load", self._on_load)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+    def _on_load(self, target, context) -> None:
+        self.rows += 1
+        state = attributes.instance_state(target)
+        for key in state.mapper.column_attrs.keys():
+            if key in state.dict:
+                value = state.dict[key]
+                self.bytes += len(value.encode("utf-8")) if isinstance(value, str) else len(str(value))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
@@ -0,0 +1,144 @@
+import difflib
+import json
+import re
+import typing
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from pydantic import BaseModel, ValidationError
+
+from schemas import QuizQuestion
+
+# A reply wrapped in a markdown code fence, despite the prompt.
+_FENCE = re.compile(r"^```[A-Za-z0-9_-]*\s*\n?(.*?)\n?```$", re.DOTALL)
+# "A) ", "(b) ", "C. ", "d: " in front of a quiz choice.
+_CHOICE_LABEL = re.compile(r"^\(?([A-Da-d])[).:]\s+")
+# An answer given as just the letter of a choice: "B", "b)", "(C)".
+_BARE_LABEL = re.compile(r"^\(?([A-Da-d])[).:]?$")
+# Answers this close to a choice are taken to mean it.
+ANSWER_MATCH_CUTOFF = 0.8
+
+
+@dataclass
+class Repaired:
+    result: BaseModel | None
+    errors: list[str] = field(default_factory=list)
+
+
+def extract_json(raw: str) -> dict:
+    """Parse the JSON object in a completion, tolerating fences and surrounding prose.
+
+    Raises ValueError if there is no JSON object to parse.
+    """
+    text = raw.strip()
+    fenced = _FENCE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError(f"AI returned non-JSON output: {e}. Raw: {raw[:200]}")
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            raise ValueError(f"AI returned non-JSON output: {e}. Raw: {raw[:200]}")
+    if not isinstance(data, dict):
+        raise ValueError("AI returned JSON that is not an object")
+    return data
+
+
+def _strip_labels(choices: list) -> list:
+    """Drop "A) "-style labels, but only when every choice carries them in order."""
+    labels = [_CHOICE_LABEL.match(c.strip()) if isinstance(c, str) else None for c in choices]
+    if not all(labels) or [m.group(1).lower() for m in labels] != list("abcd")[:len(choices)]:
+        return choices
+    return [c.strip()[m.end():] for c, m in zip(choices, labels)]
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _fix_quiz_answer(item: dict) -> dict:
+    choices, answer = item.get("choices"), item.get("answer")
+    if not isinstance(choices, list) or not isinstance(answer, str):
+        return item
+    choices = _strip_labels(choices)
+    texts = [c for c in choices if isinstance(c, str)]
+    if answer not in texts:
+        letter = _BARE_LABEL.match(answer.strip())
+        stripped = _CHOICE_LABEL.sub("", answer.strip(), count=1)
+        normalized = {_normalized(c): c for c in texts}
+        if letter and ord(letter.group(1).lower()) - ord("a") < len(texts):
+            answer = texts[ord(letter.group(1).lower()) - ord("a")]
+        elif _normalized(stripped) in normalized:
+            answer = normalized[_normalized(stripped)]
+        else:
+            close = difflib.get_close_matches(stripped, texts, n=1, cutoff=ANSWER_MATCH_CUTOFF)
+            if not close:
+                raise ValueError("answer is not one of the choices")
+            answer = close[0]
+    return {**item, "choices": choices, "answer": answer}
+
+
+# Per-item fixes applied before validation. A fix raises ValueError when the
+# item cannot be repaired.
+ITEM_REPAIRS: dict[type[BaseModel], Callable[[dict], dict]] = {
+    QuizQuestion: _fix_quiz_answer,
+}
+
+
+def _item_schema(annotation) -> type[BaseModel] | None:
+    if typing.get_origin(annotation) is not list:
+        return None
+    (item,) = typing.get_args(annotation)
+    return item if isinstance(item, type) and issubclass(item, BaseModel) else None
+
+
+def _describe(error: ValidationError, prefix: str = "") -> str:
+    first = error.errors()[0]
+    location = ".".join([prefix] * bool(prefix) + [str(part) for part in first["loc"]])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+def repair_item(item_schema: type[BaseModel], item) -> BaseModel:
+    """Validate one list item after its fix. Raises ValueError or ValidationError."""
+    if isinstance(item, dict) and item_schema in ITEM_REPAIRS:
+        item = ITEM_REPAIRS[item_schema](item)
+    return item_schema.model_validate(item)
+
+
+def repair(schema: type[BaseModel], data: dict) -> Repaired:
+    """Validate ``data`` item by item, keeping the items that are valid or fixable.
+
+    The result is None if any list field of ``schema`` ends up with no valid
+    items; ``errors`` describes everything that was dropped either way.
+    """
+    errors: list[str] = []
+    salvaged = dict(data)
+    for name, info in schema.model_fields.items():
+        item_schema = _item_schema(info.annotation)
+        if item_schema is None:
+            continue
+        items = data.get(name)
+        if not isinstance(items, list):
+            errors.append(f"{name}: expected a list")
+            return Repaired(None, errors)
+        kept = []
+        for index, item in enumerate(items):
+            try:
+                kept.append(repair_item(item_schema, item).model_dump())
+            except ValidationError as e:
+                errors.append(_describe(e, f"{name}[{index}]"))
+            except ValueError as e:
+                errors.append(f"{name}[{index}]: {e}")
+        if not kept:
+            errors.append(f"{name}: no valid items")
+            return Repaired(None, errors)
+        salvaged[name] = kept
+    try:
+        return Repaired(schema.model_validate(salvaged), errors)
+    except ValidationError as e:
+        return Repaired(None, errors + [_describe(e)])
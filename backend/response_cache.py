@@ -0,0 +1,239 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TIMEOUT = float(os.getenv("RESPONSE_CACHE_TIMEOUT", "0.05"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+ARTIFACT_KINDS = ("flashcards", "quiz", "study-plan")
+
+
+def note_key(note_id: int) -> str:
+    return f"note:{note_id}"
+
+
+def group_key(group_id: int) -> str:
+    return f"group:{group_id}"
+
+
+def _owner(note_id: int | None, group_id: int | None) -> str:
+    return f"note:{note_id}" if note_id is not None else f"group:{group_id}"
+
+
+def latest_key(kind: str, note_id: int | None = None, group_id: int | None = None) -> str:
+    return f"{_owner(note_id, group_id)}:{kind}:latest"
+
+
+def study_tools_key(note_id: int | None = None, group_id: int | None = None) -> str:
+    return f"{_owner(note_id, group_id)}:study-tools"
+
+
+def artifact_keys(kind: str, note_id: int | None = None, group_id: int | None = None) -> list[str]:
+    """Keys whose responses change when a new ``kind`` artifact is stored for the owner."""
+    return [latest_key(kind, note_id, group_id), study_tools_key(note_id, group_id)]
+
+
+def owner_keys(note_id: int | None = None, group_id: int | None = None) -> list[str]:
+    """Every key derived from a note or group, for when the owner itself changes."""
+    keys = [note_key(note_id) if note_id is not None else group_key(group_id)]
+    for kind in ARTIFACT_KINDS:
+        keys.append(latest_key(kind, note_id, group_id))
+    keys.append(study_tools_key(note_id, group_id))
+    return keys
+
+
+class MemoryBackend:
+    """In-process LRU bounded by total body size."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, body = entry
+            if expires <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes, ttl_seconds: int) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl_seconds, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def delete(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments (any Redis-protocol server).
+
+    Calls are short blocking round-trips bounded by ``RESPONSE_CACHE_TIMEOUT``.
+    """
+
+    def __init__(self, url: str, timeout: float = RESPONSE_CACHE_TIMEOUT, prefix: str = "cognify:response:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_URL is set but the redis package is not installed") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._prefix = prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(self._prefix + key)
+
+    def set(self, key: str, body: bytes, ttl_seconds: int) -> None:
+        self._client.set(self._prefix + key, body, ex=ttl_seconds)
+
+    def delete(self, keys: list[str]) -> None:
+        if keys:
+            self._client.delete(*(self._prefix + key for key in keys))
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=self._prefix + "*"):
+            self._client.delete(key)
+
+    def size(self) -> dict:
+        return {}
+
+
+class NullBackend:
+    """Caches nothing.
+
+    Used when several workers run without a shared backend: a per-process
+    cache would keep serving responses that another worker's write changed.
+    """
+
+    def get(self, key: str) -> bytes | None:
+        return None
+
+    def set(self, key: str, body: bytes, ttl_seconds: int) -> None:
+        pass
+
+    def delete(self, keys: list[str]) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def size(self) -> dict:
+        return {}
+
+
+def _backend():
+    if RESPONSE_CACHE_URL:
+        return RedisBackend(RESPONSE_CACHE_URL)
+    if WEB_CONCURRENCY > 1:
+        logger.warning("Response cache disabled: %d workers and no RESPONSE_CACHE_URL", WEB_CONCURRENCY)
+        return NullBackend()
+    return MemoryBackend()
+
+
+class ResponseCache:
+    """Read-through cache of serialized read-endpoint responses.
+
+    Writers invalidate the exact keys they affect. A reader that missed only
+    stores its body if nothing was invalidated while it was building it, so
+    a slow read cannot put back a response that a concurrent write just
+    made stale. That check is per process; with the Redis backend the TTL
+    bounds staleness across workers.
+    """
+
+    def __init__(self, backend=None, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend or MemoryBackend()
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "stale_writes": 0, "invalidations": 0, "errors": 0}
+
+    def get(self, key: str) -> tuple[bytes | None, int]:
+        """Return the cached body (or None) and a token to pass to ``set`` on a miss."""
+        with self._lock:
+            token = self._epoch
+        try:
+            body = self.backend.get(key)
+        except Exception:
+            # The cache must never turn a working read into an error.
+            logger.exception("Response cache lookup failed")
+            self._count("errors")
+            body = None
+        self._count("hits" if body is not None else "misses")
+        return body, token
+
+    def set(self, key: str, body: bytes, token: int) -> None:
+        with self._lock:
+            if token != self._epoch:
+                self._stats["stale_writes"] += 1
+                return
+            self._stats["writes"] += 1
+        try:
+            self.backend.set(key, body, self.ttl_seconds)
+        except Exception:
+            logger.exception("Response cache write failed")
+            self._count("errors")
+
+    def invalidate(self, keys: list[str]) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._stats["invalidations"] += len(keys)
+        try:
+            self.backend.delete(keys)
+        except Exception:
+            logger.exception("Response cache invalidation failed")
+            self._count("errors")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self.backend).__name__
+        stats.update(self.backend.size())
+        return stats
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+
+response_cache = ResponseCache(_backend())
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, or_, select
+
+from artifacts import ARTIFACT_TYPES
+from database import SessionLocal
+from models import GenerationJob
+from singleflight import try_advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Artifact sets kept per note or group, newest first; 0 keeps them all.
+ARTIFACT_HISTORY_KEEP = int(os.getenv("ARTIFACT_HISTORY_KEEP", "20"))
+# Sets older than this are removed, except each owner's latest; 0 disables.
+ARTIFACT_HISTORY_MAX_AGE_DAYS = int(os.getenv("ARTIFACT_HISTORY_MAX_AGE_DAYS", "0"))
+# Seconds between compaction runs; 0 (the default) disables the background task.
+ARTIFACT_COMPACTION_INTERVAL = int(os.getenv("ARTIFACT_COMPACTION_INTERVAL", "0"))
+# Rows deleted per statement, to keep each transaction short.
+ARTIFACT_COMPACTION_BATCH = int(os.getenv("ARTIFACT_COMPACTION_BATCH", "1000"))
+
+
+def prunable_ids_query(kind: str, keep: int, cutoff: datetime | None, limit: int):
+    """Ids of ``kind`` artifact rows that retention removes.
+
+    A row goes if a newer row of the same owner has identical data, if it is
+    past the newest ``keep`` of its owner, or if it is older than ``cutoff``
+    and not its owner's latest. The latest row of an owner always stays, so
+    the ``/latest`` endpoints are unaffected, and so does any row a generation
+    job points to.
+    """
+    model = ARTIFACT_TYPES[kind].model
+    job_artifacts = select(GenerationJob.artifact_id).where(
+        GenerationJob.kind == kind, GenerationJob.artifact_id.is_not(None)
+    )
+    newest_first = (model.created_at.desc(), model.id.desc())
+    ranked = select(
+        model.id,
+        model.created_at,
+        model.data_hash,
+        func.row_number().over(partition_by=(model.note_id, model.group_id), order_by=newest_first).label("position"),
+        func.row_number().over(
+            partition_by=(model.note_id, model.group_id, model.data_hash), order_by=newest_first
+        ).label("copy"),
+    ).subquery()
+    conditions = [(ranked.c.data_hash.is_not(None)) & (ranked.c.copy > 1)]
+    if keep > 0:
+        conditions.append(ranked.c.position > keep)
+    if cutoff is not None:
+        conditions.append((ranked.c.position > 1) & (ranked.c.created_at < cutoff))
+    return select(ranked.c.id).where(or_(*conditions), ranked.c.id.not_in(job_artifacts)).limit(limit)
+
+
+def compact_history(
+    keep: int = ARTIFACT_HISTORY_KEEP,
+    max_age_days: int = ARTIFACT_HISTORY_MAX_AGE_DAYS,
+    batch_size: int = ARTIFACT_COMPACTION_BATCH,
+) -> dict[str, int]:
+    """Apply the retention policy to every artifact table; returns rows removed per kind.
+
+    Returns an empty dict without doing anything if another worker is
+    already compacting.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days) if max_age_days > 0 else None
+    removed = {}
+    with try_advisory_lock("artifact-compaction") as acquired:
+        if not acquired:
+            return removed
+        with SessionLocal() as db:
+            for kind, artifact in ARTIFACT_TYPES.items():
+                model = artifact.model
+                removed[kind] = 0
+                while True:
+                    ids = db.scalars(prunable_ids_query(kind, keep, cutoff, batch_size)).all()
+                    if not ids:
+                        break
+                    db.execute(delete(model).where(model.id.in_(ids)))
+                    db.commit()
+                    removed[kind] += len(ids)
+    if any(removed.values()):
+        logger.info("Artifact history compaction removed %s", removed)
+    return removed
+
+
+async def run_compaction(interval: int = ARTIFACT_COMPACTION_INTERVAL) -> None:
+    """Compact artifact history now and then every ``interval`` seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(compact_history)
+        except Exception:
+            logger.exception("Artifact history compaction failed")
+        await asyncio.sleep(interval)
@@ -1,6 +1,9 @@
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+ArtifactKind = Literal["flashcards", "quiz", "study-plan"]
 
 
 class NoteCreate(BaseModel):
@@ -22,6 +25,38 @@ class NoteOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class NoteSummary(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    created_at: datetime
+
+
+class NotePage(BaseModel):
+    items: list[NoteSummary]
+    next_cursor: str | None
+
+
+class SimilarNote(BaseModel):
+    id: int
+    title: str
+    similarity: float
+    artifacts: list[ArtifactKind]
+
+
+class SearchHit(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    rank: float
+    created_at: datetime
+
+
+class SearchPage(BaseModel):
+    items: list[SearchHit]
+    next_offset: int | None
+
+
 class Flashcard(BaseModel):
     question: str
     answer: str
@@ -38,6 +73,11 @@ class FlashcardSetOut(BaseModel):
     flashcards: list[Flashcard]
 
 
+class FlashcardHistoryPage(BaseModel):
+    items: list[FlashcardSetOut]
+    next_cursor: str | None
+
+
 class QuizQuestion(BaseModel):
     question: str
     choices: list[str]
@@ -48,6 +88,18 @@ class QuizOut(BaseModel):
     quiz: list[QuizQuestion]
 
 
+class QuizSetOut(BaseModel):
+    id: int
+    note_id: int
+    created_at: datetime
+    quiz: list[QuizQuestion]
+
+
+class QuizHistoryPage(BaseModel):
+    items: list[QuizSetOut]
+    next_cursor: str | None
+
+
 class StudyDay(BaseModel):
     day: int
     focus: str
@@ -58,6 +110,24 @@ class StudyPlanOut(BaseModel):
     plan: list[StudyDay]
 
 
+class StudyPlanSetOut(BaseModel):
+    id: int
+    note_id: int
+    created_at: datetime
+    plan: list[StudyDay]
+
+
+class StudyPlanHistoryPage(BaseModel):
+    items: list[StudyPlanSetOut]
+    next_cursor: str | None
+
+
+class StudyToolsOut(BaseModel):
+    flashcards: list[Flashcard] | None
+    quiz: list[QuizQuestion] | None
+    plan: list[StudyDay] | None
+
+
 class GroupCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     note_ids: list[int] = Field(..., min_length=2)
@@ -70,3 +140,116 @@ class GroupOut(BaseModel):
     notes: list[NoteOut]
 
     model_config = {"from_attributes": True}
+
+
+class GroupSummary(BaseModel):
+    id: int
+    name: str
+    created_at: datetime
+    note_count: int
+
+
+class GroupPage(BaseModel):
+    items: list[GroupSummary]
+    next_cursor: str | None
+
+
+class JobCreate(BaseModel):
+    kind: ArtifactKind
+    note_id: int | None = None
+    group_id: int | None = None
+    fresh: bool = False
+
+    @model_validator(mode="after")
+    def _one_owner(self):
+        if (self.note_id is None) == (self.group_id is None):
+            raise ValueError("Exactly one of note_id or group_id is required")
+        return self
+
+
+class JobOut(BaseModel):
+    id: str
+    kind: ArtifactKind
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    note_id: int | None
+    group_id: int | None
+    artifact_id: int | None
+    result: dict | None
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+    model_config = {"from_attributes": True}
+
+
+class NoteImport(NoteCreate):
+    id: int | None = None
+    created_at: datetime | None = None
+
+
+class GroupImport(BaseModel):
+    id: int | None = None
+    name: str = Field(..., min_length=1, max_length=255)
+    note_ids: list[int] = []
+    created_at: datetime | None = None
+
+
+class ArtifactImport(BaseModel):
+    note_id: int | None = None
+    group_id: int | None = None
+    data: dict
+    created_at: datetime | None = None
+
+    @model_validator(mode="after")
+    def _one_owner(self):
+        if (self.note_id is None) == (self.group_id is None):
+            raise ValueError("Exactly one of note_id or group_id is required")
+        return self
+
+
+class ImportIssue(BaseModel):
+    location: str
+    detail: str
+
+
+class BulkImportOut(BaseModel):
+    notes: int
+    groups: int
+    artifacts: int
+    rejected: int
+    group_id: int | None
+    job_ids: list[str]
+    errors: list[ImportIssue]
+
+
+class BatchCreate(BaseModel):
+    note_ids: list[int] = []
+    group_ids: list[int] = []
+    kinds: list[ArtifactKind] = Field(..., min_length=1)
+    fresh: bool = False
+
+    @model_validator(mode="after")
+    def _has_owner(self):
+        if not self.note_ids and not self.group_ids:
+            raise ValueError("At least one note_id or group_id is required")
+        return self
+
+
+class BatchItemError(BaseModel):
+    custom_id: str
+    detail: str
+
+
+class BatchOut(BaseModel):
+    id: str
+    status: Literal["submitted", "processing", "completed", "failed"]
+    total: int
+    succeeded: int
+    failed: int
+    job_ids: list[str]
+    errors: list[BatchItemError]
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,175 @@
+import html
+import re
+
+from sqlalchemy import and_, case, func, inspect, literal, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Note
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+# The database delimits matches with these control characters; snippets are
+# HTML-escaped before they are replaced with the tags above.
+_MATCH_START = "\x02"
+_MATCH_STOP = "\x03"
+# Characters of note content returned as the snippet when the database has
+# no full-text search to highlight matches with.
+FALLBACK_SNIPPET_LENGTH = 200
+
+_PG_SETUP = [
+    # Title matches outrank body matches.
+    """
+    ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+]
+
+_SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE notes_fts USING fts5(
+        title, content, content='notes', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER notes_fts_update AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')",
+]
+
+_PG_SEARCH = text("""
+    SELECT n.id, n.title, n.created_at, hits.rank,
+        ts_headline('english', n.content, hits.query, :headline_options) AS snippet
+    FROM (
+        SELECT id, query, ts_rank_cd(search_vector, query) AS rank
+        FROM notes, websearch_to_tsquery('english', :q) AS query
+        WHERE search_vector @@ query
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS hits
+    JOIN notes n ON n.id = hits.id
+    ORDER BY hits.rank DESC, n.id DESC
+""")
+
+_SQLITE_SEARCH = text("""
+    SELECT n.id, n.title, n.created_at, -bm25(notes_fts, 10.0, 1.0) AS rank,
+        snippet(notes_fts, 1, :match_start, :match_stop, '…', 20) AS snippet
+    FROM notes_fts
+    JOIN notes n ON n.id = notes_fts.rowid
+    WHERE notes_fts MATCH :q
+    ORDER BY bm25(notes_fts, 10.0, 1.0), n.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def ensure_search_index(conn: Connection) -> None:
+    """Create the full-text index for notes if missing (no-op once applied)."""
+    if conn.dialect.name == "postgresql":
+        for statement in _PG_SETUP:
+            conn.execute(text(statement))
+    elif conn.dialect.name == "sqlite":
+        if inspect(conn).has_table("notes_fts"):
+            return
+        for statement in _SQLITE_SETUP:
+            conn.execute(text(statement))
+
+
+def _terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q)
+
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input can't trip FTS5's query syntax.
+    return " ".join(f'"{term}"' for term in _terms(q))
+
+
+def _substring_search(q: str):
+    """Notes containing every term, ranked by the number of terms in the title.
+
+    For databases without a full-text index: a scan, and no stemming.
+    """
+    terms = _terms(q)
+    if not terms:
+        return None
+    rank = sum(
+        (case((Note.title.icontains(term, autoescape=True), 1), else_=0) for term in terms),
+        literal(0),
+    )
+    matches = [
+        or_(Note.title.icontains(term, autoescape=True), Note.content.icontains(term, autoescape=True))
+        for term in terms
+    ]
+    return (
+        select(
+            Note.id,
+            Note.title,
+            Note.created_at,
+            rank.label("rank"),
+            func.substr(Note.content, 1, FALLBACK_SNIPPET_LENGTH).label("snippet"),
+        )
+        .where(and_(*matches))
+        .order_by(rank.desc(), Note.id.desc())
+    )
+
+
+def _highlight(snippet: str) -> str:
+    return (
+        html.escape(snippet)
+        .replace(_MATCH_START, HIGHLIGHT_START)
+        .replace(_MATCH_STOP, HIGHLIGHT_STOP)
+    )
+
+
+def _rows(db: Session, q: str, limit: int, offset: int) -> list:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        options = f'StartSel="{_MATCH_START}", StopSel="{_MATCH_STOP}", MaxFragments=2, MaxWords=20, MinWords=5'
+        return db.execute(
+            _PG_SEARCH, {"q": q, "headline_options": options, "limit": limit, "offset": offset}
+        ).all()
+    if dialect == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return []
+        return db.execute(
+            _SQLITE_SEARCH,
+            {
+                "q": match,
+                "match_start": _MATCH_START,
+                "match_stop": _MATCH_STOP,
+                "limit": limit,
+                "offset": offset,
+            },
+        ).all()
+    query = _substring_search(q)
+    if query is None:
+        return []
+    return db.execute(query.limit(limit).offset(offset)).all()
+
+
+def search_notes(db: Session, q: str, limit: int, offset: int) -> list[dict]:
+    """Matching notes, best first, with an HTML snippet of each.
+
+    Note text in the snippet is escaped; only the ``<mark>`` tags around
+    matches are markup.
+    """
+    return [{**row._asdict(), "snippet": _highlight(row.snippet or "")} for row in _rows(db, q, limit, offset)]
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+# Where state shared by all worker processes lives: empty uses Postgres when
+# the database is Postgres (and process memory otherwise), a redis:// URL
+# uses Redis, and "local" keeps it per process.
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "")
+SHARED_STATE_TIMEOUT = float(os.getenv("SHARED_STATE_TIMEOUT", "0.5"))
+# A Redis lock expires after this long if its holder dies without releasing it.
+SHARED_LOCK_TTL_SECONDS = int(os.getenv("SHARED_LOCK_TTL_SECONDS", "600"))
+
+
+def _lock_id(key: str) -> int:
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+def _wait(tokens: float, rate: float) -> float:
+    return 0.0 if tokens >= 0 else -tokens / rate
+
+
+class LocalState:
+    """State in process memory; only correct with a single worker process."""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, rate: float, capacity: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (float(capacity), now))
+            tokens = min(capacity, tokens + (now - updated) * rate) - 1
+            self._buckets[key] = (tokens, now)
+        return _wait(tokens, rate)
+
+    @contextmanager
+    def try_lock(self, key: str) -> Iterator[bool]:
+        # The in-process SingleFlight is the guard here.
+        yield True
+
+
+# One row per bucket, updated atomically on the database clock so that
+# workers on different hosts agree on elapsed time.
+_PG_RESERVE = text("""
+    INSERT INTO rate_limit_buckets AS bucket (key, tokens, updated_at)
+    VALUES (:key, :capacity - 1, extract(epoch FROM clock_timestamp()))
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = LEAST(
+            :capacity,
+            bucket.tokens + GREATEST(EXCLUDED.updated_at - bucket.updated_at, 0) * :rate
+        ) - 1,
+        updated_at = GREATEST(EXCLUDED.updated_at, bucket.updated_at)
+    RETURNING tokens
+""")
+
+
+class PostgresState:
+    """Rate-limit buckets in the rate_limit_buckets table; locks as advisory locks."""
+
+    def __init__(self, bind: Engine):
+        self.engine = bind
+
+    def reserve(self, key: str, rate: float, capacity: int) -> float:
+        with self.engine.begin() as conn:
+            tokens = conn.execute(_PG_RESERVE, {"key": key, "rate": rate, "capacity": capacity}).scalar_one()
+        return _wait(tokens, rate)
+
+    @contextmanager
+    def try_lock(self, key: str) -> Iterator[bool]:
+        # Session-level lock on a dedicated connection, so it spans transactions.
+        # Only the holder keeps a connection; a failed attempt returns it at once.
+        lock_id = _lock_id(key)
+        with self.engine.connect() as conn:
+            acquired = conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id})
+            conn.commit()
+            if acquired:
+                try:
+                    yield True
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                    conn.commit()
+                return
+        yield False
+
+
+# Same bucket as the Postgres statement, on the Redis server's clock. The key
+# expires once the bucket would be full again anyway.
+_REDIS_RESERVE = """
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or t
+tokens = math.min(capacity, tokens + math.max(t - updated, 0) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(math.max(t, updated)))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(tokens)
+"""
+
+
+class RedisState:
+    """Rate-limit buckets and locks in Redis (or a Redis-compatible server)."""
+
+    def __init__(self, url: str, timeout: float = SHARED_STATE_TIMEOUT, prefix: str = "cognify:shared:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL is a Redis URL but the redis package is not installed") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._reserve = self._client.register_script(_REDIS_RESERVE)
+        self._prefix = prefix
+
+    def reserve(self, key: str, rate: float, capacity: int) -> float:
+        tokens = float(self._reserve(keys=[f"{self._prefix}rate:{key}"], args=[rate, capacity]))
+        return _wait(tokens, rate)
+
+    @contextmanager
+    def try_lock(self, key: str) -> Iterator[bool]:
+        lock = self._client.lock(f"{self._prefix}lock:{key}", timeout=SHARED_LOCK_TTL_SECONDS)
+        if not lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            lock.release()
+
+
+def _backend(url: str = SHARED_STATE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    if url == "local" or engine.dialect.name != "postgresql":
+        return LocalState()
+    return PostgresState(engine)
+
+
+shared_state = _backend()
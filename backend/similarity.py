@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import os
+import re
+from array import array
+
+from sqlalchemy import delete, insert, literal, select, tuple_, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from artifacts import ARTIFACT_TYPES
+from database import SessionLocal
+from fragments import content_hash
+from models import Note, NoteSignature, NoteSignatureBand
+
+logger = logging.getLogger(__name__)
+
+# Estimated Jaccard similarity of word shingles above which notes count as
+# near-duplicates.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+SIGNATURE_BACKFILL_BATCH = int(os.getenv("SIGNATURE_BACKFILL_BATCH", "200"))
+
+SHINGLE_WORDS = 3
+# 16 bands of 8 rows: notes at 0.8 similarity share a bucket ~95% of the
+# time, notes at 0.5 under 7%.
+BANDS = 16
+ROWS = 8
+SIGNATURE_SIZE = BANDS * ROWS
+
+_WORD = re.compile(r"\w+")
+_EMPTY = 0xFFFFFFFF
+_DENSIFY_OFFSET = 0x9E3779B1
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+def signature(text: str) -> array:
+    """MinHash signature of the note's word shingles.
+
+    Uses one-permutation hashing: each shingle is hashed once, into one of
+    ``SIGNATURE_SIZE`` bins keeping the minimum per bin, and empty bins take
+    the value of the next non-empty one. That is one hash per shingle
+    instead of one per shingle and permutation, with the same LSH behaviour.
+    """
+    words = _WORD.findall(text.casefold())
+    size = min(SHINGLE_WORDS, len(words))
+    bins = array("I", [_EMPTY] * SIGNATURE_SIZE)
+    for start in range(max(len(words) - size + 1, 0) if size else 0):
+        value = _hash64(" ".join(words[start:start + size]).encode("utf-8"))
+        slot, rest = value % SIGNATURE_SIZE, (value // SIGNATURE_SIZE) & 0xFFFFFFFE
+        if rest < bins[slot]:
+            bins[slot] = rest
+    filled = sum(value != _EMPTY for value in bins)
+    if 0 < filled < SIGNATURE_SIZE:
+        # Densify: an empty bin borrows the next filled bin's value, offset by
+        # the distance and made odd (real values are even) so it only matches
+        # values borrowed the same way.
+        original = bins[:]
+        for i in range(SIGNATURE_SIZE):
+            if original[i] != _EMPTY:
+                continue
+            distance = 1
+            while original[(i + distance) % SIGNATURE_SIZE] == _EMPTY:
+                distance += 1
+            borrowed = original[(i + distance) % SIGNATURE_SIZE] + distance * _DENSIFY_OFFSET
+            bins[i] = (borrowed & 0xFFFFFFFF) | 1
+    return bins
+
+
+def is_empty(sig: array) -> bool:
+    """True for content without words, which is not compared with anything."""
+    return sig[0] == _EMPTY
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+
+def band_buckets(sig: array) -> list[int]:
+    """One bucket per band, as signed 64-bit integers for a BIGINT column."""
+    buckets = []
+    for band in range(BANDS):
+        value = _hash64(sig[band * ROWS:(band + 1) * ROWS].tobytes())
+        buckets.append(value - (1 << 64) if value >= 1 << 63 else value)
+    return buckets
+
+
+def _load(raw: bytes) -> array:
+    sig = array("I")
+    sig.frombytes(raw)
+    return sig
+
+
+def index_statements(note_id: int, content: str, sig: array | None = None) -> list:
+    """Statements that replace the note's signature and band rows."""
+    if sig is None:
+        sig = signature(content)
+    return [
+        delete(NoteSignatureBand).where(NoteSignatureBand.note_id == note_id),
+        delete(NoteSignature).where(NoteSignature.note_id == note_id),
+        insert(NoteSignature).values(note_id=note_id, content_hash=content_hash(content), signature=sig.tobytes()),
+        insert(NoteSignatureBand).values([
+            {"band": band, "bucket": bucket, "note_id": note_id} for band, bucket in enumerate(band_buckets(sig))
+        ]),
+    ]
+
+
+def signature_query(note_id: int):
+    return select(NoteSignature.content_hash, NoteSignature.signature).where(NoteSignature.note_id == note_id)
+
+
+def candidates_query(note_id: int, sig: array):
+    """Notes sharing at least one band bucket with ``sig``, with their signatures and titles."""
+    keys = list(enumerate(band_buckets(sig)))
+    matches = (
+        select(NoteSignatureBand.note_id)
+        .where(tuple_(NoteSignatureBand.band, NoteSignatureBand.bucket).in_(keys))
+        .where(NoteSignatureBand.note_id != note_id)
+        .distinct()
+    )
+    return (
+        select(Note.id, Note.title, NoteSignature.signature)
+        .join(NoteSignature, NoteSignature.note_id == Note.id)
+        .where(Note.id.in_(matches))
+    )
+
+
+def artifact_kinds_query(note_ids: list[int]):
+    """(note_id, kind) for every kind of artifact stored for each note."""
+    return union_all(*(
+        select(artifact.model.note_id, literal(kind).label("kind"))
+        .where(artifact.model.note_id.in_(note_ids))
+        .distinct()
+        for kind, artifact in ARTIFACT_TYPES.items()
+    ))
+
+
+def rank(sig: array, rows, threshold: float, limit: int) -> list[tuple[int, str, float]]:
+    """(id, title, similarity) of candidate rows at or above ``threshold``, most similar first."""
+    scored = [(row.id, row.title, similarity(sig, _load(row.signature))) for row in rows]
+    scored = [item for item in scored if item[2] >= threshold]
+    scored.sort(key=lambda item: (-item[2], item[0]))
+    return scored[:limit]
+
+
+def note_signature(db: Session, note_id: int, content: str) -> array:
+    """The note's stored signature, indexing the note first if it is missing or stale."""
+    stored = db.execute(signature_query(note_id)).first()
+    if stored and stored.content_hash == content_hash(content):
+        return _load(stored.signature)
+    try:
+        for statement in index_statements(note_id, content):
+            db.execute(statement)
+        db.commit()
+    except IntegrityError:
+        # Indexed concurrently (by the backfill or another request).
+        db.rollback()
+    return signature(content)
+
+
+def similar_notes(
+    db: Session, note_id: int, content: str, threshold: float = SIMILARITY_THRESHOLD, limit: int = 10
+) -> list[tuple[int, str, float]]:
+    sig = note_signature(db, note_id, content)
+    if is_empty(sig):
+        return []
+    return rank(sig, db.execute(candidates_query(note_id, sig)).all(), threshold, limit)
+
+
+def reusable_match(db: Session, note_id: int, content: str, kind: str) -> tuple[int, float] | None:
+    """The most similar near-duplicate note that has a ``kind`` artifact, and its similarity."""
+    matches = similar_notes(db, note_id, content)
+    if not matches:
+        return None
+    model = ARTIFACT_TYPES[kind].model
+    with_artifact = set(db.scalars(
+        select(model.note_id).where(model.note_id.in_([match_id for match_id, _, _ in matches])).distinct()
+    ))
+    for match_id, _, score in matches:
+        if match_id in with_artifact:
+            return match_id, score
+    return None
+
+
+def backfill_signatures(batch_size: int = SIGNATURE_BACKFILL_BATCH) -> int:
+    """Index notes that have no signature yet (created before indexing, or bulk imported)."""
+    indexed = 0
+    with SessionLocal() as db:
+        while True:
+            notes = db.execute(
+                select(Note.id, Note.content)
+                .outerjoin(NoteSignature, NoteSignature.note_id == Note.id)
+                .where(NoteSignature.note_id.is_(None))
+                .order_by(Note.id)
+                .limit(batch_size)
+            ).all()
+            if not notes:
+                break
+            try:
+                for note in notes:
+                    for statement in index_statements(note.id, note.content):
+                        db.execute(statement)
+                db.commit()
+            except IntegrityError:
+                # Some were indexed concurrently; the next pass skips them.
+                db.rollback()
+                continue
+            indexed += len(notes)
+    if indexed:
+        logger.info("Indexed signatures for %d notes", indexed)
+    return indexed
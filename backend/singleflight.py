@@ -0,0 +1,77 @@
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import TypeVar
+
+from shared_state import shared_state
+
+T = TypeVar("T")
+
+# Seconds between attempts to take a cross-process lock that is held elsewhere.
+LOCK_POLL_SECONDS = 0.25
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in
+    flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+@contextmanager
+def try_advisory_lock(key: str) -> Iterator[bool]:
+    """Take a cross-process lock if it is free; yields whether it was taken.
+
+    Uses the shared-state backend: a Postgres advisory lock by default, or a
+    Redis lock. Without either there is no cross-process equivalent, the lock
+    is always taken and the in-process ``SingleFlight`` is the only guard.
+    """
+    with shared_state.try_lock(key) as acquired:
+        yield acquired
+
+
+@contextmanager
+def advisory_lock(key: str, poll_seconds: float = LOCK_POLL_SECONDS) -> Iterator[None]:
+    """Serialise a critical section across worker processes.
+
+    Waiters poll instead of blocking on the lock, so they do not hold a
+    database connection while they wait.
+    """
+    while True:
+        with try_advisory_lock(key) as acquired:
+            if acquired:
+                yield
+                return
+        time.sleep(poll_seconds)
+
+
+single_flight = SingleFlight()
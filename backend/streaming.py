@@ -0,0 +1,114 @@
+import json
+import queue
+import threading
+from collections.abc import Iterator
+
+from fastapi.responses import StreamingResponse
+from openai import OpenAIError
+
+from artifacts import ARTIFACT_TYPES, NOTE_SEPARATOR
+from chunking import chunk_documents
+from fragments import FRAGMENT_KINDS
+from generation import artifact_producer, generate_artifact
+from metrics import propagate_context
+from openai_client import generate_stream
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _error_detail(error: BaseException) -> str | None:
+    if isinstance(error, ValueError):
+        return f"AI output invalid: {error}"
+    if isinstance(error, (OpenAIError, TimeoutError)):
+        return str(error)
+    return None
+
+
+def _artifact_events(
+    kind: str, notes: list[tuple[int, str]], fresh: bool, note_id: int | None, group_id: int | None
+) -> Iterator[str]:
+    artifact = ARTIFACT_TYPES[kind]
+    documents = [content for _, content in notes]
+    events: queue.SimpleQueue = queue.SimpleQueue()
+    chunks = chunk_documents(documents)
+
+    def stream_items():
+        result = None
+        for event, value in generate_stream(
+            artifact.prompt,
+            chunks[0],
+            artifact.schema,
+            artifact.items_key,
+            artifact.item_schema,
+            fresh,
+        ):
+            if event == "item":
+                events.put(("item", value.model_dump()))
+            else:
+                result = value
+        return result
+
+    # Items stream as they are generated when the non-streaming path would
+    # make this same single call; input that needs map-reduce or per-note
+    # fragments goes through that path and its items are sent at the end.
+    if len(chunks) == 1 and not (group_id is not None and kind in FRAGMENT_KINDS):
+        produce = stream_items
+    else:
+        produce = artifact_producer(kind, notes, fresh, group=group_id is not None)
+
+    def run():
+        try:
+            stored = generate_artifact(
+                kind, NOTE_SEPARATOR.join(documents), produce, fresh, note_id=note_id, group_id=group_id
+            )
+        except BaseException as e:
+            events.put(("error", e))
+        else:
+            events.put(("done", stored))
+
+    # The generation runs to completion (and is stored) even if the client
+    # disconnects, since concurrent requests for the same input may be
+    # waiting on it.
+    threading.Thread(target=propagate_context(run), daemon=True).start()
+    streamed = 0
+    while True:
+        event, value = events.get()
+        if event == "item":
+            streamed += 1
+            yield _sse("item", value)
+        elif event == "error":
+            detail = _error_detail(value)
+            if detail is None:
+                raise value
+            yield _sse("error", {"detail": detail})
+            return
+        else:
+            row_id, result = value
+            items = result.model_dump()[artifact.items_key]
+            # Joined another request's generation, or generated without streaming.
+            if not streamed:
+                for item in items:
+                    yield _sse("item", item)
+            yield _sse("done", {"id": row_id, "count": len(items)})
+            return
+
+
+def artifact_event_stream(
+    kind: str,
+    notes: list[tuple[int, str]],
+    fresh: bool = False,
+    note_id: int | None = None,
+    group_id: int | None = None,
+) -> StreamingResponse:
+    """Stream ``item`` events as the model produces them, then ``done`` or ``error``.
+
+    Generation goes through ``generate_artifact`` like the POST endpoints, so
+    concurrent streams and POSTs for the same input share one model call.
+    """
+    return StreamingResponse(
+        _artifact_events(kind, notes, fresh, note_id, group_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAIError
+from pydantic import BaseModel
+
+from artifacts import ARTIFACT_TYPES
+from chunking import chunk_documents, generate_chunked
+from metrics import propagate_context
+from openai_client import STUDY_TOOLS_PROMPT, generate_combined
+
+
+def generate_study_tools(documents: list[str], fresh: bool = False) -> dict[str, BaseModel | Exception]:
+    """Flashcards, quiz and study plan for ``documents``, keyed by artifact kind.
+
+    Input that fits in one request is covered by a single combined call.
+    Larger input needs map-reduce, which is per artifact, so each kind goes
+    through ``generate_chunked`` instead. A kind that could not be generated
+    maps to its exception.
+    """
+    chunks = chunk_documents(documents)
+    if len(chunks) == 1:
+        parts = {artifact.items_key: (artifact.prompt, artifact.schema) for artifact in ARTIFACT_TYPES.values()}
+        results = generate_combined(STUDY_TOOLS_PROMPT, chunks[0], parts, fresh)
+        return {kind: results[artifact.items_key] for kind, artifact in ARTIFACT_TYPES.items()}
+
+    def run(kind: str):
+        try:
+            return generate_chunked(kind, documents, fresh)
+        except (ValueError, OpenAIError) as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(ARTIFACT_TYPES)) as pool:
+        return dict(zip(ARTIFACT_TYPES, pool.map(propagate_context(run), ARTIFACT_TYPES)))
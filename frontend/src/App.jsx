@@ -18,6 +18,7 @@ function App() {
   const [selectMode, setSelectMode] = useState(false)
   const [searchQuery, setSearchQuery] = useState('')
   const [sortOrder, setSortOrder] = useState('newest')
+  const [searchHits, setSearchHits] = useState(null)
 
   const [activeTab, setActiveTab] = useState('flashcards')
   const [flashcards, setFlashcards] = useState(null)
@@ -90,12 +91,24 @@ function App() {
     ? `/api/groups/${selectedGroup?.id}`
     : `/api/notes/${selectedNote?.id}`
 
+  // List views only need summaries; full content is fetched when a note or group is opened.
+  const fetchAllPages = async (url) => {
+    const items = []
+    let cursor = null
+    do {
+      const res = await fetch(cursor ? `${url}?limit=200&cursor=${encodeURIComponent(cursor)}` : `${url}?limit=200`)
+      if (!res.ok) throw new Error(`Request failed (${res.status})`)
+      const page = await res.json()
+      items.push(...page.items)
+      cursor = page.next_cursor
+    } while (cursor)
+    return items
+  }
+
   const fetchNotes = async () => {
     setError('')
     try {
-      const res = await fetch('/api/notes')
-      if (!res.ok) throw new Error(`Request failed (${res.status})`)
-      setNotes(await res.json())
+      setNotes(await fetchAllPages('/api/notes/summaries'))
     } catch (e) {
       setError(e.message)
     }
@@ -103,9 +116,7 @@ function App() {
 
   const fetchGroups = async () => {
     try {
-      const res = await fetch('/api/groups')
-      if (!res.ok) throw new Error(`Request failed (${res.status})`)
-      setGroups(await res.json())
+      setGroups(await fetchAllPages('/api/groups/summaries'))
     } catch (e) {
       setError(e.message)
     }
@@ -263,20 +274,14 @@ function App() {
   }
 
   const loadSavedStudyTools = async (base) => {
-    const tryFetch = async (url, setter) => {
-      try {
-        const res = await fetch(url)
-        if (!res.ok) return
-        const data = await res.json()
-        setter(data)
-      } catch { /* no saved data */ }
-    }
-
-    await Promise.all([
-      tryFetch(`${base}/flashcards/latest`, (data) => setFlashcards(data.flashcards)),
-      tryFetch(`${base}/quiz/latest`, (data) => setQuiz(data.quiz)),
-      tryFetch(`${base}/study-plan/latest`, (data) => setPlan(data.plan)),
-    ])
+    try {
+      const res = await fetch(`${base}/study-tools`)
+      if (!res.ok) return
+      const data = await res.json()
+      if (data.flashcards) setFlashcards(data.flashcards)
+      if (data.quiz) setQuiz(data.quiz)
+      if (data.plan) setPlan(data.plan)
+    } catch { /* no saved data */ }
   }
 
   const parseErrorResponse = async (res) => {
@@ -361,6 +366,24 @@ function App() {
     fetchGroups()
   }, [])
 
+  // Summaries carry only a snippet, so matches deeper in a note come from the server.
+  useEffect(() => {
+    const q = searchQuery.trim()
+    if (!q) {
+      setSearchHits(null)
+      return
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(`/api/search?q=${encodeURIComponent(q)}&limit=200`)
+        if (res.ok) setSearchHits(new Set((await res.json()).items.map((hit) => hit.id)))
+      } catch {
+        setSearchHits(null)
+      }
+    }, 250)
+    return () => clearTimeout(timer)
+  }, [searchQuery])
+
   const renderStudyTabs = () => (
     <>
       <div className="tabs">
@@ -667,7 +690,8 @@ function App() {
       {view === 'list' && listTab === 'notes' && (() => {
         const q = searchQuery.toLowerCase()
         const filtered = q
-          ? notes.filter((n) => n.title.toLowerCase().includes(q) || n.content.toLowerCase().includes(q))
+          ? notes.filter((n) =>
+              n.title.toLowerCase().includes(q) || n.snippet.toLowerCase().includes(q) || searchHits?.has(n.id))
           : notes
         const sorted = [...filtered].sort((a, b) => {
           if (sortOrder === 'oldest') return new Date(a.created_at) - new Date(b.created_at)
@@ -816,7 +840,7 @@ function App() {
                     <span className="group-icon">&#128194;</span>
                     <div className="note-card-info">
                       <span className="note-card-title">{group.name}</span>
-                      <span className="note-card-meta">{group.notes.length} notes</span>
+                      <span className="note-card-meta">{group.note_count} notes</span>
                     </div>
                   </div>
                   <button